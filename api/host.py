@@ -1,16 +1,36 @@
+import base64
+import ipaddress
 import logging
+import re
+import uuid
 
+from datetime import datetime, timedelta, timezone
+from dateutil.parser import isoparse
 from enum import Enum
-from flask import current_app
+from timeit import default_timer
+from flask import abort, current_app, json as flask_json, Response, stream_with_context
+from sqlalchemy import cast, func, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import INET, MACADDR
 
-from app.models import Host
+from app.models import Host, HostIpAddress, HostMacAddress, SEARCH_CONFIG
 from app.auth import current_identity, requires_identity
-from app import db
+from app.exceptions import InputFormatException
+from app.host_deletion import delete_hosts
+from app.host_lookup import lookup_hosts
+from app.host_tags import update_tags
+from app import db, timing
 from api import metrics
 
 
-TAG_OPERATIONS = ("apply", "remove")
+ORDER_BY_COLUMNS = {
+    "display_name": Host.display_name,
+    "updated": Host.modified_on,
+    "created": Host.created_on,
+}
+DEFAULT_ORDER_HOW = {"display_name": "ASC", "updated": "DESC", "created": "DESC"}
 FactOperations = Enum("FactOperations", ["merge", "replace"])
+MAC_ADDRESS_SEPARATORS = re.compile(r"[:.-]")
+MAC_ADDRESS_DIGITS = re.compile(r"[0-9a-f]{12}")
 
 logger = logging.getLogger(__name__)
 
@@ -47,13 +67,20 @@ def addHost(host):
             400,
         )
 
-    found_host = Host.query.filter(
-        (Host.account == account_number)
-        & (
-            Host.canonical_facts.comparator.contains(canonical_facts)
-            | Host.canonical_facts.comparator.contained_by(canonical_facts)
-        )
-    ).first()
+    dedup_cache = current_app.config["DEDUP_CACHE"]
+    cached_host = None
+    if dedup_cache:
+        cached_host = dedup_cache.find_host(account_number, canonical_facts)
+
+    found_host = cached_host
+    if not found_host:
+        found_host = Host.query.filter(
+            (Host.account == account_number)
+            & (
+                Host.canonical_facts.comparator.contains(canonical_facts)
+                | Host.canonical_facts.comparator.contained_by(canonical_facts)
+            )
+        ).first()
 
     if not found_host:
         current_app.logger.debug("Creating a new host")
@@ -61,50 +88,334 @@ def addHost(host):
         db.session.commit()
         metrics.create_host_count.inc()
         current_app.logger.debug("Created host:%s" % input_host)
+        if dedup_cache:
+            dedup_cache.remember(input_host)
         return input_host.to_json(), 201
     else:
         current_app.logger.debug("Updating an existing host")
-        found_host.update(input_host)
-        db.session.commit()
-        metrics.update_host_count.inc()
-        current_app.logger.debug("Updated host:%s" % found_host)
+        previous_canonical_facts = dict(found_host.canonical_facts)
+        if found_host.update(input_host):
+            db.session.commit()
+            metrics.update_host_count.inc()
+            current_app.logger.debug("Updated host:%s" % found_host)
+        else:
+            if found_host.update_last_seen(
+                current_app.config["INVENTORY_CONFIG"].last_seen_interval
+            ):
+                db.session.commit()
+            metrics.noop_update_host_count.inc()
+            current_app.logger.debug("Host not changed:%s" % found_host)
+        if dedup_cache and (
+            not cached_host or found_host.canonical_facts != previous_canonical_facts
+        ):
+            dedup_cache.remember(found_host, previous_canonical_facts)
         return found_host.to_json(), 200
 
 
 @metrics.api_request_time.time()
 @requires_identity
-def getHostList(tag=None, display_name=None, page=1, per_page=100):
+def getHostList(
+    tag=None,
+    display_name=None,
+    updated_since=None,
+    q=None,
+    ip_address=None,
+    mac_address=None,
+    page=1,
+    per_page=100,
+    order_by=None,
+    order_how=None,
+):
     """
     Get the list of hosts.  Filtering can be done by the tag or display_name.
 
     If multiple tags are passed along, they are AND'd together during
     the filtering.
 
+    The hosts found by the full-text search are ordered by the relevance,
+    unless another ordering is requested.
     """
     current_app.logger.debug(
-        "getHostList(tag=%s, display_name=%s)" % (tag, display_name)
+        "getHostList(tag=%s, display_name=%s, updated_since=%s, q=%s, ip_address=%s, "
+        "mac_address=%s, order_by=%s, order_how=%s)"
+        % (
+            tag,
+            display_name,
+            updated_since,
+            q,
+            ip_address,
+            mac_address,
+            order_by,
+            order_how,
+        )
     )
 
-    if tag:
-        (total, host_list) = findHostsByTag(
-            current_identity.account_number, tag, page, per_page
+    with timing.phase("orm", exclude="db"):
+        query_results = (
+            Host.query.filter(
+                host_list_filter(
+                    current_identity.account_number,
+                    tag,
+                    display_name,
+                    updated_since,
+                    q,
+                    ip_address,
+                    mac_address,
+                )
+            )
+            .order_by(*host_list_order(order_by, order_how, q))
+            .paginate(page, per_page, True)
         )
+    total = query_results.total
+    host_list = query_results.items
+    current_app.logger.debug("found_host_list:%s" % host_list)
+
+    return _buildPaginatedHostListResponse(total, page, per_page, host_list)
+
+
+def host_list_filter(
+    account,
+    tag=None,
+    display_name=None,
+    updated_since=None,
+    q=None,
+    ip_address=None,
+    mac_address=None,
+):
+    """
+    Build the filter of the host list query.  Shared with the asynchronous
+    read API, so both return the same hosts.
+    """
+    filters = Host.account == account
+    if tag:
+        filters &= Host.tags.comparator.contains(tag)
     elif display_name:
-        (total, host_list) = findHostsByDisplayName(
-            current_identity.account_number, display_name, page, per_page
+        filters &= Host.display_name.comparator.contains(display_name)
+    if updated_since:
+        filters &= Host.modified_on > _parse_timestamp(updated_since)
+    if q:
+        filters &= Host.search_vector.op("@@")(_search_query(q))
+    if ip_address:
+        network = cast(_parse_network(ip_address), INET)
+        filters &= _address_filter(
+            account, HostIpAddress, HostIpAddress.address.op("<<=")(network)
+        )
+    if mac_address:
+        address = cast(_parse_mac_address(mac_address), MACADDR)
+        filters &= _address_filter(
+            account, HostMacAddress, HostMacAddress.address == address
+        )
+    return filters
+
+
+def _address_filter(account, model, address_filter):
+    # The address tables are indexed by (account, address)
+    return Host.id.in_(
+        select(model.host_id).where((model.account == account) & address_filter)
+    )
+
+
+def _parse_network(value):
+    """
+    Convert an IP address or a CIDR network to a network, an address being a
+    network of its own.
+    """
+    try:
+        return str(ipaddress.ip_network(value, strict=False))
+    except ValueError:
+        raise InputFormatException(f"Invalid IP address or network: {value}")
+
+
+def _parse_mac_address(value):
+    digits = MAC_ADDRESS_SEPARATORS.sub("", value).lower()
+    if not MAC_ADDRESS_DIGITS.fullmatch(digits):
+        raise InputFormatException(f"Invalid MAC address: {value}")
+    return ":".join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+
+def _search_query(q):
+    # The configuration is a literal, a bound parameter would be typed as a
+    # text by asyncpg instead of a regconfig
+    return func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), q)
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def getHostFactCounts(
+    canonical_fact=None, fact=None, tag=None, display_name=None, page=1, per_page=100
+):
+    """
+    Count the hosts grouped by the value of a canonical fact or of a fact
+    given by its path: a namespace followed by the keys, separated by
+    slashes.  The hosts are filtered the same way as in the host list.  The
+    results are cached for a short time.
+    """
+    current_app.logger.debug(
+        "getHostFactCounts(canonical_fact=%s, fact=%s, tag=%s, display_name=%s)"
+        % (canonical_fact, fact, tag, display_name)
+    )
+
+    if bool(canonical_fact) == bool(fact):
+        return (
+            "Invalid request:  Exactly one of the canonical_fact or fact "
+            "parameters must be present.",
+            400,
         )
+
+    if canonical_fact:
+        value = Host.canonical_facts[canonical_fact].astext
     else:
-        query_results = Host.query.filter(
-            Host.account == current_identity.account_number
-        ).paginate(page, per_page, True)
-        total = query_results.total
-        host_list = query_results.items
+        fact_path = tuple(fact.split("/"))
+        if len(fact_path) < 2 or not all(fact_path):
+            raise InputFormatException(
+                f"Invalid fact path: {fact}, expected namespace/key"
+            )
+        value = Host.facts[fact_path].astext
+
+    account = current_identity.account_number
+    cache = current_app.config["AGGREGATION_CACHE"]
+    cache_key = (
+        account,
+        canonical_fact,
+        fact,
+        tuple(tag or ()),
+        display_name,
+        page,
+        per_page,
+    )
+    response = cache.get(cache_key)
+    if response is None:
+        response = _countHostsByValue(
+            value, host_list_filter(account, tag, display_name), page, per_page
+        )
+        cache.set(cache_key, response)
 
-    return _buildPaginatedHostListResponse(total, page, per_page, host_list)
+    return response, 200
+
+
+def _countHostsByValue(value, filters, page, per_page):
+    # The total number of the groups is counted by a window function over
+    # the grouped rows, so a single query returns both
+    value = value.label("value")
+    rows = (
+        db.session.query(
+            value,
+            func.count().label("count"),
+            func.count().over().label("total"),
+        )
+        .filter(filters)
+        .group_by(value)
+        .order_by(func.count().desc(), value)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+        .all()
+    )
+    if not rows and page != 1:
+        abort(404)
+
+    return {
+        "total": rows[0].total if rows else 0,
+        "count": len(rows),
+        "page": page,
+        "per_page": per_page,
+        "results": [{"value": row.value, "count": row.count} for row in rows],
+    }
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def getHostChanges(cursor=None, updated_since=None, limit=100):
+    """
+    Read the hosts changed since the last read, in the order of their
+    modification.  The returned cursor points after the last returned host
+    and is passed to the next call to continue.  Without a cursor, the feed
+    starts at updated_since or at the beginning.
+
+    The position is compared as a (modified_on, id) row, so every page is
+    read by a range scan of the (account, modified_on, id) index.  Deleted
+    hosts are not reported.
+
+    The modification time is set before the change is committed, so a
+    transaction committing later could add a host behind a cursor already
+    returned.  Only the hosts modified longer than the settle time ago are
+    returned, which no write transaction is expected to outlast.
+    """
+    current_app.logger.debug(
+        "getHostChanges(cursor=%s, updated_since=%s, limit=%d)"
+        % (cursor, updated_since, limit)
+    )
+
+    settle_time = current_app.config["INVENTORY_CONFIG"].changes_settle_time
+    filters = (Host.account == current_identity.account_number) & (
+        Host.modified_on < datetime.utcnow() - timedelta(seconds=settle_time)
+    )
+    if cursor:
+        modified_on, host_id = _decode_change_cursor(cursor)
+        filters &= tuple_(Host.modified_on, Host.id) > tuple_(modified_on, host_id)
+    elif updated_since:
+        filters &= Host.modified_on > _parse_timestamp(updated_since)
+
+    host_list = (
+        Host.query.filter(filters)
+        .order_by(Host.modified_on, Host.id)
+        .limit(limit)
+        .all()
+    )
+
+    if host_list:
+        cursor = _encode_change_cursor(host_list[-1])
+
+    return (
+        {
+            "count": len(host_list),
+            "cursor": cursor,
+            "results": [host.to_json() for host in host_list],
+        },
+        200,
+    )
+
+
+def _encode_change_cursor(host):
+    position = {"updated": host.modified_on.isoformat(), "id": str(host.id)}
+    return base64.urlsafe_b64encode(flask_json.dumps(position).encode()).decode()
+
+
+def _decode_change_cursor(cursor):
+    try:
+        position = flask_json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return isoparse(position["updated"]), uuid.UUID(position["id"])
+    except (ValueError, TypeError, KeyError):
+        raise InputFormatException(f"Invalid cursor: {cursor}")
+
+
+def host_id_filter(account, host_id_list):
+    return (Host.account == account) & Host.id.in_(host_id_list)
+
+
+def host_list_order(order_by=None, order_how=None, q=None):
+    """
+    Build the ordering of the host list query.  The ID breaks the ties in the
+    same direction, so the ordering matches an (account, <column>, id) index
+    and a page can be read by an index range scan without sorting.  Without
+    an explicit ordering, the hosts found by a search are ordered by the
+    relevance, the most relevant first.
+    """
+    if order_by is None and q:
+        column = func.ts_rank(Host.search_vector, _search_query(q))
+        if (order_how or "DESC") == "DESC":
+            return column.desc(), Host.id.desc()
+        return column.asc(), Host.id.asc()
+
+    order_by = order_by or "updated"
+    column = ORDER_BY_COLUMNS[order_by]
+    if (order_how or DEFAULT_ORDER_HOW[order_by]) == "DESC":
+        return column.desc(), Host.id.desc()
+    return column.asc(), Host.id.asc()
 
 
 def _buildPaginatedHostListResponse(total, page, per_page, host_list):
-    json_host_list = [host.to_json() for host in host_list]
+    with timing.phase("serialization"):
+        json_host_list = [host.to_json() for host in host_list]
     return (
         {
             "total": total,
@@ -117,39 +428,235 @@ def _buildPaginatedHostListResponse(total, page, per_page, host_list):
     )
 
 
-def findHostsByTag(account, tag, page, per_page):
-    current_app.logger.debug("findHostsByTag(%s)" % tag)
-    query_results = Host.query.filter(
-        (Host.account == account) & Host.tags.comparator.contains(tag)
-    ).paginate(page, per_page, True)
+@metrics.api_request_time.time()
+@requires_identity
+def getHostById(hostId, page=1, per_page=100, order_by="updated", order_how=None):
+    current_app.logger.debug("getHostById(%s, %d, %d)" % (hostId, page, per_page))
+    with timing.phase("orm", exclude="db"):
+        query_results = (
+            Host.query.filter(host_id_filter(current_identity.account_number, hostId))
+            .order_by(*host_list_order(order_by, order_how))
+            .paginate(page, per_page, True)
+        )
     total = query_results.total
     found_host_list = query_results.items
-    current_app.logger.debug("found_host_list:%s" % found_host_list)
-    return (total, found_host_list)
 
+    return _buildPaginatedHostListResponse(total, page, per_page, found_host_list)
 
-def findHostsByDisplayName(account, display_name, page, per_page):
-    current_app.logger.debug("findHostsByDisplayName(%s)" % display_name)
-    query_results = Host.query.filter(
-        (Host.account == account) & Host.display_name.comparator.contains(display_name)
-    ).paginate(page, per_page, True)
-    total = query_results.total
-    found_host_list = query_results.items
-    current_app.logger.debug("found_host_list:%s" % found_host_list)
-    return (total, found_host_list)
+
+@requires_identity
+def lookupHosts(lookup):
+    """
+    Find hosts by a list of IDs too long to be passed in the URL.  The found
+    hosts are streamed back as they are read from the database, followed by
+    the IDs that were not found.  The request time is recorded when the
+    stream ends, not when the view returns.
+    """
+    current_app.logger.debug("lookupHosts(%d IDs)" % len(lookup["ids"]))
+
+    start = default_timer()
+    try:
+        try:
+            host_id_list = list(
+                dict.fromkeys(uuid.UUID(host_id) for host_id in lookup["ids"])
+            )
+        except ValueError:
+            raise InputFormatException("Invalid host ID in the lookup list")
+
+        hosts = lookup_hosts(
+            current_identity.account_number,
+            host_id_list,
+            current_app.config["INVENTORY_CONFIG"].lookup_temp_table_threshold,
+        )
+    except Exception:
+        metrics.api_request_time.observe(default_timer() - start)
+        raise
+
+    # The body is not buffered, so it is not checked by the response validation
+    return Response(
+        stream_with_context(_stream_lookup_response(hosts, host_id_list, start)),
+        mimetype="application/json",
+        direct_passthrough=True,
+    )
+
+
+def _stream_lookup_response(hosts, host_id_list, start):
+    # A direct passthrough body is written by the WSGI server as is, so the
+    # chunks are bytes
+    try:
+        missing = set(host_id_list)
+        separator = b""
+        yield b'{"results": ['
+        for host in hosts:
+            yield separator + flask_json.dumps(host.to_json()).encode()
+            separator = b","
+            missing.discard(host.id)
+        missing_id_list = [
+            str(host_id) for host_id in host_id_list if host_id in missing
+        ]
+        yield b'], "count": %d, "missing": %s}' % (
+            len(host_id_list) - len(missing),
+            flask_json.dumps(missing_id_list).encode(),
+        )
+    finally:
+        metrics.api_request_time.observe(default_timer() - start)
 
 
 @metrics.api_request_time.time()
 @requires_identity
-def getHostById(hostId, page=1, per_page=100):
-    current_app.logger.debug("getHostById(%s, %d, %d)" % (hostId, page, per_page))
-    query_results = Host.query.filter(
-        (Host.account == current_identity.account_number) & Host.id.in_(hostId)
-    ).paginate(page, per_page, True)
-    total = query_results.total
-    found_host_list = query_results.items
+def deleteHost(hostId):
+    current_app.logger.debug("deleteHost(%s)" % hostId)
 
-    return _buildPaginatedHostListResponse(total, page, per_page, found_host_list)
+    deleted = delete_hosts(
+        host_id_filter(current_identity.account_number, hostId),
+        current_app.config["INVENTORY_CONFIG"].delete_chunk_size,
+        current_app.config["DEDUP_CACHE"],
+    )
+
+    return {"deleted": deleted}, 200
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def deleteHostList(tag=None, display_name=None, updated_before=None):
+    """
+    Delete all hosts matching the filters.
+    """
+    current_app.logger.debug(
+        "deleteHostList(tag=%s, display_name=%s, updated_before=%s)"
+        % (tag, display_name, updated_before)
+    )
+
+    if not (tag or display_name or updated_before):
+        return (
+            "Invalid request:  At least one of the tag, display_name or "
+            "updated_before filters must be present.",
+            400,
+        )
+
+    filters = host_match_filter(
+        current_identity.account_number, tag, display_name, updated_before
+    )
+    deleted = delete_hosts(
+        filters,
+        current_app.config["INVENTORY_CONFIG"].delete_chunk_size,
+        current_app.config["DEDUP_CACHE"],
+    )
+
+    return {"deleted": deleted}, 200
+
+
+def host_match_filter(account, tag=None, display_name=None, updated_before=None):
+    """
+    Build the filter of the bulk operations.  Unlike in the host list query,
+    all provided filters must match.
+    """
+    filters = Host.account == account
+    if tag:
+        filters &= Host.tags.comparator.contains(tag)
+    if display_name:
+        filters &= Host.display_name.comparator.contains(display_name)
+    if updated_before:
+        # Not checked in, even without a change
+        filters &= Host.last_seen < _parse_timestamp(updated_before)
+    return filters
+
+
+def _parse_timestamp(value):
+    """
+    Convert an ISO 8601 timestamp to a naive UTC datetime, the way the
+    timestamps are stored.
+    """
+    try:
+        timestamp = isoparse(value)
+    except ValueError:
+        raise InputFormatException(f"Invalid timestamp: {value}")
+
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def updateHostTags(hostId, tag_operation):
+    current_app.logger.debug("updateHostTags(%s, %s)" % (hostId, tag_operation))
+
+    return _updateTags(
+        tag_operation, host_id_filter(current_identity.account_number, hostId)
+    )
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def updateHostListTags(
+    tag_operation, tag=None, display_name=None, updated_before=None
+):
+    """
+    Apply or remove tags on all hosts matching the filters.  Without any
+    filter, all hosts of the account are changed.
+    """
+    current_app.logger.debug(
+        "updateHostListTags(%s, tag=%s, display_name=%s, updated_before=%s)"
+        % (tag_operation, tag, display_name, updated_before)
+    )
+
+    return _updateTags(
+        tag_operation,
+        host_match_filter(
+            current_identity.account_number, tag, display_name, updated_before
+        ),
+    )
+
+
+def _updateTags(tag_operation, filters):
+    updated = update_tags(
+        tag_operation["operation"],
+        tag_operation["tags"],
+        filters,
+        current_app.config["INVENTORY_CONFIG"].tag_chunk_size,
+    )
+
+    return {"updated": updated}, 200
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def getHostFacts(hostId, namespace, page=1, per_page=100):
+    """
+    Get the facts under a single namespace.  Only the namespace is selected
+    from the facts column, the other namespaces are neither sent by the
+    database nor serialized.
+    """
+    current_app.logger.debug(
+        "getHostFacts(%s, %s, %d, %d)" % (hostId, namespace, page, per_page)
+    )
+
+    query_results = (
+        db.session.query(Host.id, Host.facts[namespace].label("facts"))
+        .filter(
+            host_id_filter(current_identity.account_number, hostId)
+            & Host.facts.has_key(namespace)
+        )
+        .order_by(Host.id)
+        .paginate(page, per_page, True)
+    )
+    # A namespace stored as null has no facts
+    results = [
+        {"id": str(host_id), "facts": facts or {}}
+        for host_id, facts in query_results.items
+    ]
+
+    return (
+        {
+            "total": query_results.total,
+            "count": len(results),
+            "page": page,
+            "per_page": per_page,
+            "results": results,
+        },
+        200,
+    )
 
 
 @metrics.api_request_time.time()
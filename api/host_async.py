@@ -0,0 +1,114 @@
+import logging
+
+from connexion.exceptions import ProblemException
+from sqlalchemy import func, select
+from werkzeug.exceptions import NotFound
+
+from app.auth import requires_identity_async
+from app.exceptions import InventoryException
+from app.models import Host
+from api import metrics
+from api.host import (
+    host_list_filter,
+    host_id_filter,
+    host_list_order,
+    _buildPaginatedHostListResponse,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@requires_identity_async
+async def getHostList(
+    request,
+    tag=None,
+    display_name=None,
+    updated_since=None,
+    q=None,
+    ip_address=None,
+    mac_address=None,
+    page=1,
+    per_page=100,
+    order_by=None,
+    order_how=None,
+):
+    """
+    The asynchronous counterpart of api.host.getHostList.
+    """
+    logger.debug(
+        "getHostList(tag=%s, display_name=%s, updated_since=%s, q=%s, "
+        "ip_address=%s, mac_address=%s)",
+        tag,
+        display_name,
+        updated_since,
+        q,
+        ip_address,
+        mac_address,
+    )
+
+    with metrics.api_request_time.time():
+        try:
+            filters = host_list_filter(
+                request["identity"].account_number,
+                tag,
+                display_name,
+                updated_since,
+                q,
+                ip_address,
+                mac_address,
+            )
+        except InventoryException as exception:
+            # Rendered by the problem middleware like in the Flask application
+            raise ProblemException(
+                status=exception.status,
+                title=exception.title,
+                detail=exception.detail,
+            )
+        order = host_list_order(order_by, order_how, q)
+        return await _paginate(request, filters, order, page, per_page)
+
+
+@requires_identity_async
+async def getHostById(
+    request, hostId, page=1, per_page=100, order_by="updated", order_how=None
+):
+    """
+    The asynchronous counterpart of api.host.getHostById.
+    """
+    logger.debug("getHostById(%s, %d, %d)", hostId, page, per_page)
+
+    with metrics.api_request_time.time():
+        filters = host_id_filter(request["identity"].account_number, hostId)
+        order = host_list_order(order_by, order_how)
+        return await _paginate(request, filters, order, page, per_page)
+
+
+async def _paginate(request, filters, order, page, per_page):
+    # Mirror the Flask-SQLAlchemy pagination with error_out enabled
+    if page < 1 or per_page < 0:
+        raise NotFound()
+
+    session_factory = request.config_dict["db_session_factory"]
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Host)
+            .where(filters)
+            .order_by(*order)
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+        )
+        host_list = result.scalars().all()
+
+        if not host_list and page != 1:
+            raise NotFound()
+
+        if page == 1 and len(host_list) < per_page:
+            total = len(host_list)
+        else:
+            total = await session.scalar(
+                select(func.count()).select_from(Host).where(filters)
+            )
+
+    return _buildPaginatedHostListResponse(total, page, per_page, host_list)
+
@@ -0,0 +1,152 @@
+from flask import abort, current_app
+
+from app.auth import current_identity, requires_identity
+from app.exceptions import InputFormatException
+from app.host_deletion import delete_hosts
+from app.host_facts import FACT_OPERATIONS, update_facts
+from app.host_tags import TAG_OPERATIONS, update_tags
+from app.jobs import submit_job
+from app.models import Job
+from api import metrics
+from api.host import _parse_timestamp, host_match_filter
+
+
+FILTERS = ("tag", "display_name", "updated_before")
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def submitJob(job):
+    """
+    Queue a bulk operation to be run by a job worker.  The parameters are
+    validated now, so an invalid job is rejected instead of failing later.
+    """
+    current_app.logger.debug("submitJob(%s)" % job)
+
+    operation = job["operation"]
+    parameters = job.get("parameters", {})
+    VALIDATORS[operation](parameters)
+
+    job = submit_job(current_identity.account_number, operation, parameters)
+
+    return job.to_json(), 202, {"Location": _job_url(job)}
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def getJob(jobId):
+    current_app.logger.debug("getJob(%s)" % jobId)
+
+    job = Job.query.filter(
+        (Job.account == current_identity.account_number) & (Job.id == jobId)
+    ).first()
+    if job is None:
+        abort(404, "Job not found.")
+
+    return job.to_json(), 200
+
+
+def _job_url(job):
+    api_path = current_app.config["INVENTORY_CONFIG"].api_url_path_prefix
+    return f"{api_path}/jobs/{job.id}"
+
+
+def _validate_filters(parameters, required=False):
+    filters = parameters.get("filters", {})
+    if not isinstance(filters, dict) or set(filters) - set(FILTERS):
+        raise InputFormatException(
+            f"The filters must be an object with the {', '.join(FILTERS)} keys."
+        )
+    if required and not any(filters.values()):
+        raise InputFormatException(
+            "At least one of the tag, display_name or updated_before filters "
+            "must be present."
+        )
+
+    tag = filters.get("tag", [])
+    if not isinstance(tag, list) or not all(isinstance(item, str) for item in tag):
+        raise InputFormatException("The tag filter must be a list of tags.")
+    if not isinstance(filters.get("display_name", ""), str):
+        raise InputFormatException("The display_name filter must be a string.")
+    if filters.get("updated_before"):
+        _parse_timestamp(filters["updated_before"])
+
+
+def _validate_delete_hosts(parameters):
+    _validate_filters(parameters, required=True)
+
+
+def _validate_update_tags(parameters):
+    _validate_filters(parameters)
+    if parameters.get("operation") not in TAG_OPERATIONS:
+        raise InputFormatException(
+            f"The operation must be one of {', '.join(TAG_OPERATIONS)}."
+        )
+    tags = parameters.get("tags")
+    if not tags or not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise InputFormatException("The tags must be a non-empty list of tags.")
+
+
+def _validate_update_facts(parameters):
+    _validate_filters(parameters)
+    if parameters.get("operation") not in FACT_OPERATIONS:
+        raise InputFormatException(
+            f"The operation must be one of {', '.join(FACT_OPERATIONS)}."
+        )
+    if not parameters.get("namespace") or not isinstance(parameters["namespace"], str):
+        raise InputFormatException("The namespace must be a non-empty string.")
+    if not isinstance(parameters.get("facts"), dict):
+        raise InputFormatException("The facts must be an object.")
+    if parameters["operation"] == "merge" and not parameters["facts"]:
+        raise InputFormatException("Merging empty facts into existing facts is a no-op.")
+
+
+def _filters(account, parameters):
+    return host_match_filter(account, **parameters.get("filters", {}))
+
+
+def _run_delete_hosts(account, parameters, chunk_size, report):
+    deleted = delete_hosts(
+        _filters(account, parameters),
+        chunk_size,
+        current_app.config["DEDUP_CACHE"],
+        report,
+    )
+    return {"deleted": deleted}
+
+
+def _run_update_tags(account, parameters, chunk_size, report):
+    updated = update_tags(
+        parameters["operation"],
+        parameters["tags"],
+        _filters(account, parameters),
+        chunk_size,
+        report,
+    )
+    return {"updated": updated}
+
+
+def _run_update_facts(account, parameters, chunk_size, report):
+    updated = update_facts(
+        parameters["operation"],
+        parameters["namespace"],
+        parameters["facts"],
+        _filters(account, parameters),
+        chunk_size,
+        report,
+    )
+    return {"updated": updated}
+
+
+VALIDATORS = {
+    "delete_hosts": _validate_delete_hosts,
+    "update_tags": _validate_update_tags,
+    "update_facts": _validate_update_facts,
+}
+
+# The job handlers run by the workers, see the run_jobs command
+HANDLERS = {
+    "delete_hosts": _run_delete_hosts,
+    "update_tags": _run_update_tags,
+    "update_facts": _run_update_facts,
+}
@@ -1,5 +1,22 @@
-from prometheus_client import Counter, Summary
+from prometheus_client import Counter, Gauge, Histogram, Summary
 
 api_request_time = Summary("inventory_request_processing_seconds", "Time spent processing request")
+rate_limited_request_count = Counter("inventory_rate_limited_request_count", "The total amount of requests rejected by a per-account limit", ["operation", "limit"])
+request_phase_time = Histogram("inventory_request_phase_seconds", "Time spent in a phase of processing request", ["phase"])
 create_host_count = Counter("inventory_create_host_count", "The total amount of hosts created")
 update_host_count = Counter("inventory_update_host_count", "The total amount of hosts updated")
+dedup_cache_lookup_count = Counter("inventory_dedup_cache_lookup_count", "The total amount of host deduplication cache lookups", ["result"])
+noop_update_host_count = Counter("inventory_noop_update_host_count", "The total amount of host updates skipped because nothing changed")
+delete_host_count = Counter("inventory_delete_host_count", "The total amount of hosts deleted")
+job_count = Counter("inventory_job_count", "The total amount of jobs by the operation and the reached status", ["operation", "status"])
+update_host_tags_count = Counter("inventory_update_host_tags_count", "The total amount of hosts with applied or removed tags", ["operation"])
+
+db_pool_checked_out = Gauge("inventory_db_pool_checked_out", "The number of database connections checked out of the pool", multiprocess_mode="livesum")
+db_pool_overflow = Gauge("inventory_db_pool_overflow", "The number of database connections opened over the pool size", multiprocess_mode="livesum")
+db_pool_checkout_wait_time = Histogram("inventory_db_pool_checkout_wait_seconds", "Time spent waiting for a database connection from the pool")
+db_pool_checkout_timeout_count = Counter("inventory_db_pool_checkout_timeout_count", "The total amount of timed out waits for a database connection")
+db_connection_age = Histogram("inventory_db_connection_age_seconds", "Age of the database connections checked out of the pool", buckets=(1, 10, 60, 300, 600, 1800, 3600, 7200, 21600, 86400, float("inf")))
+cull_host_count = Counter("inventory_cull_host_count", "The total amount of stale hosts culled", ["mode"])
+hosts_table_size = Gauge("inventory_hosts_table_size_bytes", "The total size of the hosts table including indexes", ["phase"], multiprocess_mode="mostrecent")
+hosts_table_rows = Gauge("inventory_hosts_table_rows", "The estimated number of rows in the hosts table", ["phase"], multiprocess_mode="mostrecent")
+metrics_scrape_time = Histogram("inventory_metrics_scrape_seconds", "Time spent collecting the metrics of all processes for a scrape")
@@ -1,5 +1,12 @@
-from flask import Blueprint
-from prometheus_client import CollectorRegistry, multiprocess, generate_latest, CONTENT_TYPE_LATEST
+import os
+
+from flask import abort, Blueprint, current_app, send_from_directory
+from werkzeug.security import safe_join
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from api.metrics import metrics_scrape_time
+from app.multiprocess_metrics import generate_metrics, metrics_directory
+from app.profiling import list_profiles
 
 monitoring_blueprint = Blueprint("monitoring", __name__)
 
@@ -12,7 +19,44 @@ def health():
 @monitoring_blueprint.route("/metrics", methods=['GET'])
 def metrics():
     headers = {'content-type': CONTENT_TYPE_LATEST}
-    registry = CollectorRegistry()
-    multiprocess.MultiProcessCollector(registry)
-    prometheus_data = generate_latest(registry)
+    # Reading the files of all the processes is not cheap, consecutive
+    # scrapes share the result
+    cache = current_app.config["METRICS_CACHE"]
+    prometheus_data = cache.get("metrics")
+    if prometheus_data is None:
+        with metrics_scrape_time.time():
+            prometheus_data = generate_metrics(metrics_directory())
+        cache.set("metrics", prometheus_data)
     return prometheus_data, 200, headers
+
+
+@monitoring_blueprint.route("/profiles", methods=['GET'])
+def profiles():
+    profile_dir = _profile_dir()
+    return {
+        operation_id: list_profiles(os.path.join(profile_dir, operation_id))
+        for operation_id in sorted(os.listdir(profile_dir))
+        if os.path.isdir(os.path.join(profile_dir, operation_id))
+    }, 200
+
+
+@monitoring_blueprint.route("/profiles/<operation_id>/<file_name>", methods=['GET'])
+def profile(operation_id, file_name):
+    # Both the operation directory and the file must stay inside of the
+    # profile directory
+    operation_dir = safe_join(_profile_dir(), operation_id)
+    if operation_dir is None:
+        abort(404)
+    return send_from_directory(
+        operation_dir,
+        file_name,
+        mimetype="application/octet-stream",
+        as_attachment=True,
+    )
+
+
+def _profile_dir():
+    profile_dir = current_app.config["INVENTORY_CONFIG"].profile_dir
+    if not profile_dir or not os.path.isdir(profile_dir):
+        abort(404)
+    return profile_dir
@@ -0,0 +1,35 @@
+from flask import current_app
+
+from app.auth import current_identity, requires_identity
+from app.models import HostTagCount
+from api import metrics
+
+
+@metrics.api_request_time.time()
+@requires_identity
+def getTags(search=None, page=1, per_page=100):
+    """
+    Get the list of distinct tags of the account with the number of hosts
+    carrying them.  Read from the summary table maintained by triggers, so
+    no host is scanned.
+    """
+    current_app.logger.debug("getTags(search=%s)" % search)
+
+    query = HostTagCount.query.filter(
+        HostTagCount.account == current_identity.account_number
+    )
+    if search:
+        query = query.filter(HostTagCount.tag.contains(search, autoescape=True))
+
+    query_results = query.order_by(HostTagCount.tag).paginate(page, per_page, True)
+
+    return (
+        {
+            "total": query_results.total,
+            "count": len(query_results.items),
+            "page": page,
+            "per_page": per_page,
+            "results": [tag_count.to_json() for tag_count in query_results.items],
+        },
+        200,
+    )
@@ -1,3 +1,6 @@
+import copy
+import hashlib
+import json
 import os
 import connexion
 import yaml
@@ -7,8 +10,31 @@ from flask import jsonify
 
 from api.mgmt import monitoring_blueprint
 from app.config import Config
+from app.db_pool import InstrumentedQueuePool
 from app.models import db
+from app.cache import TTLCache
+from app.dedup_cache import create_dedup_cache
 from app.exceptions import InventoryException
+from app import timing
+from app.profiling import create_profiler
+from app.rate_limit import create_rate_limiter
+
+
+class WrappingResolver(RestyResolver):
+    """
+    Resolves the API operations wrapped by the given wrappers, the first
+    one being the outermost.
+    """
+
+    def __init__(self, default_module_name, wrappers, **kwargs):
+        super().__init__(default_module_name, **kwargs)
+        self.wrappers = wrappers
+
+    def resolve_function_from_operation_id(self, operation_id):
+        function = super().resolve_function_from_operation_id(operation_id)
+        for wrapper in reversed(self.wrappers):
+            function = wrapper(operation_id, function)
+        return function
 
 
 def render_exception(exception):
@@ -17,6 +43,71 @@ def render_exception(exception):
     return response
 
 
+SPEC_PATH = "swagger/api.spec.yaml"
+
+_parsed_spec = None
+
+
+def _spec_cache_path():
+    return os.getenv("INVENTORY_API_SPEC_CACHE", "swagger/api.spec.cache.json")
+
+
+def _read_spec_cache(digest):
+    try:
+        with open(_spec_cache_path()) as fp:
+            cached = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    if cached.get("digest") != digest:
+        return None
+    return cached["spec"]
+
+
+def _write_spec_cache(digest, spec):
+    cache_path = _spec_cache_path()
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w") as fp:
+            json.dump({"digest": digest, "spec": spec}, fp)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # The cache is only an optimization, a read-only deployment
+        # parses the YAML file every time
+        pass
+
+
+def _parse_spec():
+    """
+    Parse the swagger.yml file.  The parsed document is stored in a JSON
+    file next to it, which is much faster to load, and reused for as long as
+    the YAML file does not change.
+    """
+    with open(SPEC_PATH, "rb") as fp:
+        raw_spec = fp.read()
+    digest = hashlib.sha256(raw_spec).hexdigest()
+
+    spec = _read_spec_cache(digest)
+    if spec is None:
+        spec = yaml.load(raw_spec, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        _write_spec_cache(digest, spec)
+    return spec
+
+
+def load_spec():
+    global _parsed_spec
+    if _parsed_spec is None:
+        _parsed_spec = _parse_spec()
+
+    spec = copy.deepcopy(_parsed_spec)
+
+    # If we want to disable auth we first make the header not required
+    if os.getenv("FLASK_DEBUG") and os.getenv("NOAUTH"):
+        spec["parameters"]["rhIdentityHeader"]["required"] = False
+
+    return spec
+
+
 def create_app(config_name):
     connexion_options = {"swagger_ui": True}
 
@@ -26,18 +117,20 @@ def create_app(config_name):
         "inventory", specification_dir="./swagger/", options=connexion_options
     )
 
-    # Read the swagger.yml file to configure the endpoints
-    with open("swagger/api.spec.yaml", "rb") as fp:
-        spec = yaml.safe_load(fp)
+    spec = load_spec()
 
-    # If we want to disable auth we first make the header not required
-    if os.getenv("FLASK_DEBUG") and os.getenv("NOAUTH"):
-        spec["parameters"]["rhIdentityHeader"]["required"] = False
+    operation_wrappers = [timing.wrap]
+    rate_limiter = create_rate_limiter(app_config)
+    if rate_limiter:
+        operation_wrappers.append(rate_limiter.wrap)
+    profiler = create_profiler(app_config)
+    if profiler:
+        operation_wrappers.append(profiler.wrap)
 
     connexion_app.add_api(
         spec,
         arguments={"title": "RestyResolver Example"},
-        resolver=RestyResolver("api"),
+        resolver=WrappingResolver("api", operation_wrappers),
         validate_responses=True,
         strict_validation=True,
         base_path=app_config.api_url_path_prefix,
@@ -49,13 +142,25 @@ def create_app(config_name):
 
     flask_app = connexion_app.app
 
+    flask_app.config["INVENTORY_CONFIG"] = app_config
+    flask_app.config["AGGREGATION_CACHE"] = TTLCache(app_config.aggregation_cache_ttl)
+    flask_app.config["DEDUP_CACHE"] = create_dedup_cache(app_config)
+    flask_app.config["METRICS_CACHE"] = TTLCache(app_config.metrics_cache_ttl, max_size=1)
     flask_app.config["SQLALCHEMY_ECHO"] = False
     flask_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = app_config.db_uri
     flask_app.config["SQLALCHEMY_POOL_SIZE"] = app_config.db_pool_size
     flask_app.config["SQLALCHEMY_POOL_TIMEOUT"] = app_config.db_pool_timeout
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "poolclass": InstrumentedQueuePool,
+        "max_overflow": app_config.db_pool_max_overflow,
+        "pool_recycle": app_config.db_pool_recycle,
+        "pool_pre_ping": app_config.db_pool_pre_ping,
+        "connect_args": app_config.db_connect_args,
+    }
 
     db.init_app(flask_app)
+    timing.init_app(flask_app)
 
     flask_app.register_blueprint(monitoring_blueprint,
                                  url_prefix=app_config.mgmt_url_path_prefix)
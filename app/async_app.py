@@ -0,0 +1,99 @@
+"""
+An optional asyncio-based application serving the read-only host operations.
+
+The operations are served from the same API specification as the Flask
+application, so the routing, request validation and response format are the
+same. Only the database access differs: the views in api.host_async use an
+asyncpg connection pool, so a single process can serve many concurrent
+queries.
+"""
+import connexion
+
+from connexion.resolver import Resolver
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import load_spec
+from app.config import Config
+from app.db_pool import InstrumentedAsyncQueuePool
+from app.rate_limit import create_rate_limiter
+
+
+ASYNC_OPERATIONS = {
+    "api.host.getHostList": "api.host_async.getHostList",
+    "api.host.getHostById": "api.host_async.getHostById",
+}
+
+
+def _read_only_spec(spec):
+    """
+    Strip the specification down to the operations that have an asynchronous
+    implementation.
+    """
+    paths = {}
+    for path, path_item in spec["paths"].items():
+        operations = {
+            method: operation
+            for method, operation in path_item.items()
+            if method == "parameters"
+            or (
+                isinstance(operation, dict)
+                and operation.get("operationId") in ASYNC_OPERATIONS
+            )
+        }
+        if set(operations) - {"parameters"}:
+            paths[path] = operations
+    return {**spec, "paths": paths}
+
+
+def _async_function_resolver(rate_limiter):
+    def _resolve_async_function(operation_id):
+        function = connexion.utils.get_function_from_name(
+            ASYNC_OPERATIONS[operation_id]
+        )
+        if rate_limiter:
+            # Counted together with the operations of the Flask application
+            function = rate_limiter.wrap_async(operation_id, function)
+        return function
+
+    return _resolve_async_function
+
+
+def create_async_app(config_name):
+    app_config = Config(config_name)
+
+    connexion_app = connexion.AioHttpApp(__name__)
+
+    connexion_app.add_api(
+        _read_only_spec(load_spec()),
+        resolver=Resolver(_async_function_resolver(create_rate_limiter(app_config))),
+        validate_responses=True,
+        strict_validation=True,
+        base_path=app_config.api_url_path_prefix,
+        pass_context_arg_name="request",
+    )
+
+    aiohttp_app = connexion_app.app
+
+    async def _create_engine(app):
+        engine = create_async_engine(
+            app_config.async_db_uri,
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=app_config.db_pool_size,
+            pool_timeout=app_config.db_pool_timeout,
+            max_overflow=app_config.db_pool_max_overflow,
+            pool_recycle=app_config.db_pool_recycle,
+            pool_pre_ping=app_config.db_pool_pre_ping,
+        )
+        app["db_engine"] = engine
+        app["db_session_factory"] = sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+    async def _dispose_engine(app):
+        await app["db_engine"].dispose()
+
+    aiohttp_app.on_startup.append(_create_engine)
+    aiohttp_app.on_cleanup.append(_dispose_engine)
+
+    return aiohttp_app
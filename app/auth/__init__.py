@@ -1,11 +1,19 @@
 import os
 from functools import wraps
+from app import timing
 from app.auth.identity import from_encoded, validate, Identity
 from flask import abort, request, _request_ctx_stack
 from werkzeug.local import LocalProxy
 from werkzeug.exceptions import Forbidden
 
-__all__ = ["init_app", "current_identity", "NoIdentityError", "requires_identity"]
+__all__ = [
+    "init_app",
+    "current_identity",
+    "NoIdentityError",
+    "peek_account_number",
+    "requires_identity",
+    "requires_identity_async",
+]
 
 _IDENTITY_HEADER = "x-rh-identity"
 
@@ -14,12 +22,15 @@ class NoIdentityError(RuntimeError):
     pass
 
 
-def _pick_identity():
+def _pick_identity(headers=None):
     if os.getenv("FLASK_DEBUG") and os.getenv("NOAUTH"):
         return Identity(account_number="0000001")
     else:
+        if headers is None:
+            headers = request.headers
+
         try:
-            payload = request.headers[_IDENTITY_HEADER]
+            payload = headers[_IDENTITY_HEADER]
         except KeyError:
             abort(Forbidden.code)
 
@@ -39,8 +50,9 @@ def _validate(identity):
 def requires_identity(view_func):
     @wraps(view_func)
     def _wrapper(*args, **kwargs):
-        identity = _pick_identity()
-        _validate(identity)
+        with timing.phase("identity"):
+            identity = _pick_identity()
+            _validate(identity)
         ctx = _request_ctx_stack.top
         ctx.identity = identity
         return view_func(*args, **kwargs)
@@ -48,6 +60,35 @@ def requires_identity(view_func):
     return _wrapper
 
 
+def peek_account_number(headers=None):
+    """
+    The account number of the request identity for the code running before
+    requires_identity.  None when the identity is missing or invalid.
+    """
+    try:
+        identity = _pick_identity(headers)
+        _validate(identity)
+    except Forbidden:
+        return None
+    return identity.account_number
+
+
+def requires_identity_async(view_func):
+    """
+    The requires_identity counterpart for coroutine views served by the
+    asynchronous application. The identity is stored in the aiohttp request
+    instead of the Flask request context.
+    """
+    @wraps(view_func)
+    async def _wrapper(request, *args, **kwargs):
+        identity = _pick_identity(request.headers)
+        _validate(identity)
+        request["identity"] = identity
+        return await view_func(request, *args, **kwargs)
+
+    return _wrapper
+
+
 def _get_identity():
     ctx = _request_ctx_stack.top
     try:
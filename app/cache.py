@@ -0,0 +1,51 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A small thread-safe in-process cache.  The entries expire after the time
+    to live, and the least recently stored ones are evicted once the cache is
+    full.  Every worker process has its own cache.
+    """
+
+    def __init__(self, ttl, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
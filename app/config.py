@@ -11,8 +11,50 @@ class Config:
         self._db_name = os.getenv("INVENTORY_DB_NAME", "test_db")
 
         self.db_uri = f"postgresql://{self._db_user}:{self._db_password}@{self._db_host}/{self._db_name}"
+        self.async_db_uri = self.db_uri.replace("postgresql://", "postgresql+asyncpg://", 1)
         self.db_pool_timeout = int(os.getenv("INVENTORY_DB_POOL_TIMEOUT", "5"))
         self.db_pool_size = int(os.getenv("INVENTORY_DB_POOL_SIZE", "5"))
+        self.db_pool_max_overflow = int(os.getenv("INVENTORY_DB_POOL_MAX_OVERFLOW", "10"))
+        self.db_pool_recycle = int(os.getenv("INVENTORY_DB_POOL_RECYCLE", "-1"))
+        self.db_pool_pre_ping = os.getenv("INVENTORY_DB_POOL_PRE_PING", "false").lower() == "true"
+        self.db_connect_args = self._build_db_connect_args()
+
+        self.delete_chunk_size = self._build_chunk_size("INVENTORY_DELETE_CHUNK_SIZE")
+        self.tag_chunk_size = self._build_chunk_size("INVENTORY_TAG_CHUNK_SIZE")
+        self.job_chunk_size = self._build_chunk_size("INVENTORY_JOB_CHUNK_SIZE")
+        self.job_chunk_pause = float(os.getenv("INVENTORY_JOB_CHUNK_PAUSE", "0.1"))
+        self.job_lease_time = int(os.getenv("INVENTORY_JOB_LEASE_TIME", "300"))
+        self.lookup_temp_table_threshold = int(
+            os.getenv("INVENTORY_LOOKUP_TEMP_TABLE_THRESHOLD", "10000")
+        )
+
+        self.dedup_cache_uri = os.getenv("INVENTORY_DEDUP_CACHE_URI", "memory://")
+        self.dedup_cache_ttl = int(os.getenv("INVENTORY_DEDUP_CACHE_TTL", "3600"))
+
+        self.aggregation_cache_ttl = int(os.getenv("INVENTORY_AGGREGATION_CACHE_TTL", "60"))
+
+        self.changes_settle_time = int(os.getenv("INVENTORY_CHANGES_SETTLE_TIME", "10"))
+
+        self.metrics_cache_ttl = int(os.getenv("INVENTORY_METRICS_CACHE_TTL", "5"))
+
+        self.profile_dir = os.getenv("INVENTORY_PROFILE_DIR")
+        self.profile_sample_rate = float(os.getenv("INVENTORY_PROFILE_SAMPLE_RATE", "0"))
+        self.profile_token = os.getenv("INVENTORY_PROFILE_TOKEN")
+        self.profile_max_files = int(os.getenv("INVENTORY_PROFILE_MAX_FILES", "100"))
+
+        self.rate_limit_storage_uri = os.getenv("INVENTORY_RATE_LIMIT_STORAGE_URI", "memory://")
+        self.rate_limits = self._build_operation_limits("INVENTORY_RATE_LIMITS")
+        self.concurrency_limits = {
+            operation: int(limit)
+            for operation, limit in self._build_operation_limits(
+                "INVENTORY_CONCURRENCY_LIMITS"
+            ).items()
+        }
+        self.concurrency_timeout = int(os.getenv("INVENTORY_CONCURRENCY_TIMEOUT", "60"))
+
+        self.last_seen_interval = int(os.getenv("INVENTORY_LAST_SEEN_INTERVAL", "3600"))
+        self.cull_retention_days = int(os.getenv("INVENTORY_CULL_RETENTION_DAYS", "90"))
+        self.cull_retention_overrides = self._build_cull_retention_overrides()
 
         self.base_url_path = self._build_base_url_path()
         self.api_url_path_prefix = self._build_api_path()
@@ -20,6 +62,44 @@ class Config:
 
         self._log_configuration()
 
+    def _build_db_connect_args(self):
+        if os.getenv("INVENTORY_DB_TCP_KEEPALIVES", "false").lower() != "true":
+            return {}
+
+        # libpq TCP keepalive parameters, unset values use the system defaults
+        connect_args = {"keepalives": 1}
+        for arg in ("keepalives_idle", "keepalives_interval", "keepalives_count"):
+            value = os.getenv(f"INVENTORY_DB_TCP_{arg.upper()}")
+            if value:
+                connect_args[arg] = int(value)
+        return connect_args
+
+    def _build_chunk_size(self, env_var):
+        # A chunk of no hosts would never finish the bulk operation
+        chunk_size = int(os.getenv(env_var, "1000"))
+        if chunk_size < 1:
+            raise ValueError(f"{env_var} must be a positive number, not {chunk_size}")
+        return chunk_size
+
+    def _build_cull_retention_overrides(self):
+        # A comma separated list of account:days pairs
+        overrides = os.getenv("INVENTORY_CULL_RETENTION_OVERRIDES", "")
+        retention_days = {}
+        for override in filter(None, overrides.split(",")):
+            account, days = override.split(":")
+            retention_days[account.strip()] = int(days)
+        return retention_days
+
+    def _build_operation_limits(self, env_var):
+        # A comma separated list of operation=limit pairs, the "default"
+        # operation applies to the operations not listed
+        limits = os.getenv(env_var, "")
+        operation_limits = {}
+        for operation_limit in filter(None, limits.split(",")):
+            operation, limit = operation_limit.split("=")
+            operation_limits[operation.strip()] = limit.strip()
+        return operation_limits
+
     def _build_base_url_path(self):
         app_name = os.getenv("APP_NAME", "inventory")
         path_prefix = os.getenv("PATH_PREFIX", "/r/insights/platform")
@@ -39,3 +119,5 @@ class Config:
             print("Management URL Path Preifx: %s" % self.mgmt_url_path_prefix)
             print("DB Host: %s" % self._db_host)
             print("DB Name: %s" % self._db_name)
+            print("DB Pool Size: %s" % self.db_pool_size)
+            print("DB Pool Max Overflow: %s" % self.db_pool_max_overflow)
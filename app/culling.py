@@ -0,0 +1,161 @@
+import logging
+import time
+
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from api import metrics
+from app.models import db, Host, HostArchive
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def cull_hosts(config, archive=True, batch_size=DEFAULT_BATCH_SIZE, pause=0):
+    """
+    Remove the hosts that have not checked in for longer than the retention
+    period of their account.  The removed hosts are moved to the archive table
+    unless archive is False.
+
+    Every account is processed separately in batches ordered by the last
+    check-in time, so each batch is an index range scan.  Every batch is
+    committed in its own transaction, followed by an optional pause to throttle
+    the load on the database.  Returns the number of culled hosts.
+    """
+    if batch_size < 1:
+        raise ValueError(f"Invalid batch size: {batch_size}")
+
+    _export_table_size("before")
+
+    now = datetime.utcnow()
+    culled = 0
+    for account in _accounts():
+        retention_days = config.cull_retention_overrides.get(
+            account, config.cull_retention_days
+        )
+        cutoff = now - timedelta(days=retention_days)
+        culled += _cull_account(account, cutoff, archive, batch_size, pause)
+
+    _export_table_size("after")
+
+    logger.info("Culled %d hosts", culled)
+    return culled
+
+
+def _accounts():
+    # Emulate a loose index scan, reading one index entry per account
+    # instead of scanning all hosts
+    hosts_table = Host.__table__.name
+    result = db.session.execute(
+        text(
+            f"""
+            WITH RECURSIVE accounts AS (
+                (SELECT account FROM {hosts_table}
+                 WHERE account IS NOT NULL ORDER BY account LIMIT 1)
+                UNION ALL
+                SELECT (SELECT h.account FROM {hosts_table} h
+                        WHERE h.account > accounts.account
+                        ORDER BY h.account LIMIT 1)
+                FROM accounts
+                WHERE accounts.account IS NOT NULL
+            )
+            SELECT account FROM accounts WHERE account IS NOT NULL
+            """
+        )
+    )
+    accounts = [row.account for row in result]
+    db.session.commit()
+    return accounts
+
+
+def _cull_account(account, cutoff, archive, batch_size, pause):
+    statement = text(_archive_sql() if archive else _delete_sql())
+    params = {"account": account, "cutoff": cutoff, "batch_size": batch_size}
+    mode = "archive" if archive else "delete"
+
+    culled = 0
+    while True:
+        try:
+            batch_culled = db.session.execute(statement, params).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        culled += batch_culled
+        metrics.cull_host_count.labels(mode).inc(batch_culled)
+
+        if batch_culled < batch_size:
+            break
+
+        if pause:
+            time.sleep(pause)
+
+    if culled:
+        logger.info("Culled %d hosts of the account %s", culled, account)
+    return culled
+
+
+def _stale_hosts_sql():
+    return f"""
+        SELECT id FROM {Host.__table__.name}
+        WHERE account = :account AND last_seen < :cutoff
+        ORDER BY last_seen, id
+        LIMIT :batch_size
+    """
+
+
+def _delete_sql():
+    return f"""
+        DELETE FROM {Host.__table__.name}
+        WHERE id IN ({_stale_hosts_sql()})
+    """
+
+
+def _archive_sql():
+    return f"""
+        WITH culled AS (
+            DELETE FROM {Host.__table__.name}
+            WHERE id IN ({_stale_hosts_sql()})
+            RETURNING id, account, display_name, created_on, modified_on, tags,
+                      canonical_facts
+        )
+        INSERT INTO {HostArchive.__table__.name}
+            (id, account, display_name, created_on, modified_on, archived_on,
+             tags, canonical_facts)
+        SELECT id, account, display_name, created_on, modified_on,
+               timezone('utc', now()), tags, canonical_facts
+        FROM culled
+        ON CONFLICT (id) DO UPDATE SET
+            account = excluded.account,
+            display_name = excluded.display_name,
+            created_on = excluded.created_on,
+            modified_on = excluded.modified_on,
+            archived_on = excluded.archived_on,
+            tags = excluded.tags,
+            canonical_facts = excluded.canonical_facts
+    """
+
+
+def _export_table_size(phase):
+    result = db.session.execute(
+        text(
+            "SELECT pg_total_relation_size(c.oid) AS size, "
+            "greatest(c.reltuples, 0) AS rows "
+            "FROM pg_class c WHERE c.oid = to_regclass(:table)"
+        ),
+        {"table": Host.__table__.name},
+    ).first()
+    db.session.commit()
+
+    if result:
+        metrics.hosts_table_size.labels(phase).set(result.size)
+        metrics.hosts_table_rows.labels(phase).set(result.rows)
+        logger.info(
+            "Hosts table size %s culling: %d bytes, ~%d rows",
+            phase,
+            result.size,
+            result.rows,
+        )
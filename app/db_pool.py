@@ -0,0 +1,47 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from api import metrics
+
+
+class _PoolInstrumentation:
+    """
+    Exports the state of a connection pool as Prometheus metrics. The pool
+    does not emit an event before a checkout starts waiting for a connection,
+    so the checkout and return of the connections are wrapped instead.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection_record = super()._do_get()
+        except exc.TimeoutError:
+            metrics.db_pool_checkout_timeout_count.inc()
+            raise
+        finally:
+            metrics.db_pool_checkout_wait_time.observe(time.perf_counter() - start)
+
+        if connection_record.starttime is not None:
+            metrics.db_connection_age.observe(
+                time.time() - connection_record.starttime
+            )
+        self._export_usage()
+        return connection_record
+
+    def _do_return_conn(self, connection_record):
+        super()._do_return_conn(connection_record)
+        self._export_usage()
+
+    def _export_usage(self):
+        metrics.db_pool_checked_out.set(self.checkedout())
+        metrics.db_pool_overflow.set(max(self.overflow(), 0))
+
+
+class InstrumentedQueuePool(_PoolInstrumentation, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolInstrumentation, AsyncAdaptedQueuePool):
+    pass
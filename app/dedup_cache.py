@@ -0,0 +1,163 @@
+"""
+A cache of the host deduplication matches.
+
+A host checking in again is looked up by its canonical facts, which is a JSON
+containment query.  The cache maps every (account, canonical fact) pair of
+the known hosts to the host ID, so the host is fetched by its primary key
+instead.  The fetched host is checked to still match the canonical facts, so
+an entry that was not invalidated, e.g. after a host was culled or changed by
+another worker with its own local cache, only costs the regular query.
+"""
+import json
+import logging
+
+from api import metrics
+from app.cache import TTLCache
+from app.models import Host
+
+
+KEY_PREFIX = "dedup"
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """
+    An in-process stand-in of a shared backend, every worker process has its
+    own entries.
+    """
+
+    def __init__(self, ttl, max_size=100000):
+        self._cache = TTLCache(ttl, max_size)
+
+    def get_many(self, keys):
+        return [self._cache.get(key) for key in keys]
+
+    def set_many(self, mapping):
+        for key, value in mapping.items():
+            self._cache.set(key, value)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self._cache.delete(key)
+
+
+class RedisBackend:
+    """
+    A backend shared by all the worker processes.
+    """
+
+    def __init__(self, uri, ttl):
+        import redis
+
+        self._redis = redis.Redis.from_url(uri, decode_responses=True)
+        self._ttl = ttl
+
+    def get_many(self, keys):
+        return self._redis.mget(keys)
+
+    def set_many(self, mapping):
+        pipeline = self._redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, value, ex=self._ttl)
+        pipeline.execute()
+
+    def delete_many(self, keys):
+        if keys:
+            self._redis.delete(*keys)
+
+
+class DedupCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def find_host(self, account, canonical_facts):
+        """
+        The host matching the canonical facts the same way as the
+        deduplication query does, or None when it is not cached.
+        """
+        try:
+            host_ids = self.backend.get_many(_keys(account, canonical_facts))
+        except Exception:
+            logger.exception("Unable to read the deduplication cache")
+            return None
+
+        host_ids = list(dict.fromkeys(filter(None, host_ids)))
+        if not host_ids:
+            metrics.dedup_cache_lookup_count.labels("miss").inc()
+            return None
+
+        hosts = Host.query.filter((Host.account == account) & Host.id.in_(host_ids))
+        for host in hosts:
+            if _contains(host.canonical_facts, canonical_facts) or _contains(
+                canonical_facts, host.canonical_facts
+            ):
+                metrics.dedup_cache_lookup_count.labels("hit").inc()
+                return host
+
+        metrics.dedup_cache_lookup_count.labels("stale").inc()
+        return None
+
+    def remember(self, host, previous_canonical_facts=None):
+        """
+        Store the host under all its canonical facts.  The entries of the
+        previous canonical facts the host no longer has are removed.
+        """
+        keys = _keys(host.account, host.canonical_facts)
+        try:
+            if previous_canonical_facts:
+                previous_keys = _keys(host.account, previous_canonical_facts)
+                self.backend.delete_many(list(set(previous_keys) - set(keys)))
+            self.backend.set_many(dict.fromkeys(keys, str(host.id)))
+        except Exception:
+            logger.exception("Unable to update the deduplication cache")
+
+    def forget(self, hosts):
+        """
+        Remove the entries of the (account, canonical facts) pairs of the
+        deleted hosts.
+        """
+        keys = [
+            key
+            for account, canonical_facts in hosts
+            for key in _keys(account, canonical_facts)
+        ]
+        try:
+            self.backend.delete_many(keys)
+        except Exception:
+            logger.exception("Unable to update the deduplication cache")
+
+
+def create_dedup_cache(config):
+    if not config.dedup_cache_uri:
+        return None
+
+    if config.dedup_cache_uri == "memory://":
+        backend = LocalBackend(config.dedup_cache_ttl)
+    else:
+        backend = RedisBackend(config.dedup_cache_uri, config.dedup_cache_ttl)
+    return DedupCache(backend)
+
+
+def _keys(account, canonical_facts):
+    # The values are normalized by their JSON form, lists included
+    return [
+        f"{KEY_PREFIX}:{account}:{name}:{json.dumps(value, sort_keys=True)}"
+        for name, value in sorted(canonical_facts.items())
+    ]
+
+
+def _contains(container, contained):
+    """
+    The JSON containment (the @> operator) of the deduplication query.
+    """
+    if isinstance(contained, dict):
+        return isinstance(container, dict) and all(
+            name in container and _contains(container[name], value)
+            for name, value in contained.items()
+        )
+    if isinstance(contained, list):
+        return isinstance(container, list) and all(
+            any(_contains(item, value) for item in container) for value in contained
+        )
+    return container == contained
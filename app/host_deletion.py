@@ -0,0 +1,53 @@
+import logging
+
+from sqlalchemy import delete
+
+from api import metrics
+from app.models import db, Host
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def delete_hosts(filters, chunk_size=DEFAULT_CHUNK_SIZE, dedup_cache=None, report=None):
+    """
+    Delete the hosts matching the filters and return their count.
+
+    The hosts are deleted in chunks, every chunk being committed in its own
+    transaction, so a large delete neither holds its locks until the very end
+    nor produces a single huge transaction.  The deleted hosts are removed
+    from the deduplication cache, if given.  The report function, if given,
+    is called with the number of the hosts deleted so far after every chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
+
+    deleted = 0
+
+    while True:
+        chunk = db.session.query(Host.id).filter(filters).limit(chunk_size)
+        statement = delete(Host.__table__).where(Host.id.in_(chunk.subquery()))
+        if dedup_cache:
+            statement = statement.returning(Host.account, Host.canonical_facts)
+        try:
+            result = db.session.execute(statement)
+            chunk_deleted = result.rowcount
+            deleted_hosts = result.fetchall() if dedup_cache else []
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if dedup_cache:
+            dedup_cache.forget(deleted_hosts)
+
+        deleted += chunk_deleted
+        metrics.delete_host_count.inc(chunk_deleted)
+        logger.debug("Deleted a chunk of %d hosts", chunk_deleted)
+        if report:
+            report(deleted)
+
+        if chunk_deleted < chunk_size:
+            return deleted
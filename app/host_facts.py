@@ -0,0 +1,75 @@
+import logging
+
+from sqlalchemy import case, cast, func
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+
+from app.models import db, Host
+
+
+FACT_OPERATIONS = ("merge", "replace")
+DEFAULT_CHUNK_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def update_facts(
+    operation, namespace, facts, filters, chunk_size=DEFAULT_CHUNK_SIZE, report=None
+):
+    """
+    Merge or replace the facts in the namespace of the hosts matching the
+    filters and return the number of changed hosts.  Only the hosts already
+    having the namespace are changed, an empty (null) namespace being filled
+    in like by the mergeFacts and replaceFacts operations.
+
+    Like the tag updates, every chunk is changed by a single UPDATE statement
+    excluding the hosts the operation would not change, and committed in its
+    own transaction.  The report function, if given, is called with the number of
+    the hosts changed so far after every chunk.
+    """
+    if operation not in FACT_OPERATIONS:
+        raise ValueError(f"Invalid fact operation: {operation}")
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
+
+    fact_object = cast(facts, JSONB)
+    current_facts = Host.facts[namespace]
+
+    if operation == "merge":
+        # The merge is shallow, unlike the containment (@>) of the facts
+        new_namespace_facts = case(
+            (func.jsonb_typeof(current_facts) == "object", current_facts),
+            else_=cast({}, JSONB),
+        ).op("||")(fact_object)
+    else:
+        new_namespace_facts = fact_object
+
+    filters = (
+        filters
+        & Host.facts.has_key(namespace)
+        & current_facts.is_distinct_from(new_namespace_facts)
+    )
+
+    new_facts = func.jsonb_set(
+        Host.facts, cast([namespace], ARRAY(db.Text)), new_namespace_facts
+    )
+
+    updated = 0
+
+    while True:
+        chunk = db.session.query(Host.id).filter(filters).limit(chunk_size)
+        try:
+            chunk_updated = Host.query.filter(Host.id.in_(chunk.subquery())).update(
+                {Host.facts: new_facts}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        updated += chunk_updated
+        logger.debug("Changed the facts of a chunk of %d hosts", chunk_updated)
+        if report:
+            report(updated)
+
+        if chunk_updated < chunk_size:
+            return updated
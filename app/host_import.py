@@ -0,0 +1,376 @@
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+
+from sqlalchemy import text
+
+from api import metrics
+from app.exceptions import InputFormatException
+from app.models import db, Host
+
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_LAST_SEEN_INTERVAL = 3600
+
+_STAGE_TABLE = "host_import_stage"
+_STAGE_COLUMNS = ("seq", "id", "account", "display_name", "canonical_facts", "facts")
+
+logger = logging.getLogger(__name__)
+
+
+class ImportProgress:
+    def __init__(
+        self, offset=0, lines=0, created=0, updated=0, unchanged=0, skipped=0
+    ):
+        self.offset = offset
+        self.lines = lines
+        self.created = created
+        self.updated = updated
+        self.unchanged = unchanged
+        self.skipped = skipped
+
+    def to_json(self):
+        return {
+            "offset": self.offset,
+            "lines": self.lines,
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "skipped": self.skipped,
+        }
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(**d)
+
+    def __repr__(self):
+        return (
+            "<ImportProgress lines=%d created=%d updated=%d unchanged=%d "
+            "skipped=%d offset=%d>"
+            % (
+                self.lines,
+                self.created,
+                self.updated,
+                self.unchanged,
+                self.skipped,
+                self.offset,
+            )
+        )
+
+
+def load_checkpoint(checkpoint_path):
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return ImportProgress()
+
+    with open(checkpoint_path) as fp:
+        return ImportProgress.from_json(json.load(fp))
+
+
+def save_checkpoint(checkpoint_path, progress):
+    if not checkpoint_path:
+        return
+
+    # Write to a temporary file first so an interrupted write never leaves
+    # a truncated checkpoint behind
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, "w") as fp:
+        json.dump(progress.to_json(), fp)
+    os.replace(temp_path, checkpoint_path)
+
+
+def import_hosts(
+    path,
+    batch_size=DEFAULT_BATCH_SIZE,
+    checkpoint_path=None,
+    progress_callback=None,
+    last_seen_interval=DEFAULT_LAST_SEEN_INTERVAL,
+):
+    """
+    Import hosts from an NDJSON file, one Host object per line.
+
+    The hosts are deduplicated and merged using the same canonical facts rules
+    as the addHost operation.  The file is processed in batches, every batch
+    being committed in its own transaction.  If a checkpoint path is given, the
+    progress is stored there after every batch and a subsequent run continues
+    where the previous one stopped.  Like addHost, the hosts that would not
+    change only have their last check-in time updated, at most once per
+    last_seen_interval seconds.
+    """
+    progress = load_checkpoint(checkpoint_path)
+    if progress.offset:
+        logger.info("Resuming the import of %s from %s", path, progress)
+
+    with open(path, "rb") as fp:
+        fp.seek(progress.offset)
+
+        batch = []
+        for raw_line in iter(fp.readline, b""):
+            progress.offset += len(raw_line)
+            progress.lines += 1
+
+            input_host = _parse_line(raw_line, progress.lines)
+            if input_host is None:
+                if raw_line.strip():
+                    progress.skipped += 1
+                continue
+
+            batch.append(input_host)
+            if len(batch) >= batch_size:
+                _commit_batch(
+                    batch, progress, checkpoint_path, progress_callback, last_seen_interval
+                )
+                batch = []
+
+        _commit_batch(
+            batch, progress, checkpoint_path, progress_callback, last_seen_interval
+        )
+
+    return progress
+
+
+def _parse_line(raw_line, line_number):
+    if not raw_line.strip():
+        return None
+
+    try:
+        host = json.loads(raw_line)
+        if not isinstance(host, dict):
+            raise ValueError("A host must be a JSON object")
+        input_host = Host.from_json(host)
+    except (ValueError, InputFormatException) as e:
+        logger.warning("Skipping line %d: %s", line_number, e)
+        return None
+
+    if not input_host.account:
+        logger.warning("Skipping line %d: the account number is missing", line_number)
+        return None
+
+    if not input_host.canonical_facts:
+        logger.warning(
+            "Skipping line %d: at least one of the canonical fact fields "
+            "must be present",
+            line_number,
+        )
+        return None
+
+    return input_host
+
+
+def _commit_batch(
+    batch, progress, checkpoint_path, progress_callback, last_seen_interval
+):
+    if batch:
+        (created, updated, unchanged) = merge_hosts(batch, last_seen_interval)
+        progress.created += created
+        progress.updated += updated
+        progress.unchanged += unchanged
+        metrics.create_host_count.inc(created)
+        metrics.update_host_count.inc(updated)
+        metrics.noop_update_host_count.inc(unchanged)
+
+    save_checkpoint(checkpoint_path, progress)
+
+    logger.info("Import progress: %s", progress)
+    if progress_callback:
+        progress_callback(progress)
+
+
+def merge_hosts(input_hosts, last_seen_interval=DEFAULT_LAST_SEEN_INTERVAL):
+    """
+    Merge a batch of hosts into the database in a single transaction.  Returns
+    a (created, updated, unchanged) tuple of host counts.  Like in addHost,
+    the hosts that would not change are not written, except for their last
+    check-in time.
+    """
+    staged_hosts = _coalesce_hosts(input_hosts)
+
+    try:
+        _stage_hosts(staged_hosts)
+
+        updated = 0
+        unchanged = 0
+        while True:
+            # Apply at most one staged host per existing host in every round,
+            # so the merge is equivalent to a sequence of addHost calls
+            result = db.session.execute(
+                text(_merge_sql()), {"last_seen_interval": last_seen_interval}
+            ).first()
+            if not result.applied:
+                break
+            updated += result.updated
+            unchanged += result.applied - result.updated
+
+        created = db.session.execute(text(_insert_sql())).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return (created, updated, unchanged)
+
+
+def _coalesce_hosts(input_hosts):
+    """
+    Merge the hosts within a batch that match each other by their canonical
+    facts, preserving their order.  Only hosts sharing a fact with an identical
+    value are considered.
+    """
+    coalesced = []
+    index = {}
+
+    for input_host in input_hosts:
+        candidates = set()
+        for key in _fact_keys(input_host):
+            candidates.update(index.get(key, ()))
+
+        target = next(
+            (
+                i
+                for i in sorted(candidates)
+                if _canonical_facts_match(coalesced[i], input_host)
+            ),
+            None,
+        )
+
+        if target is not None:
+            coalesced[target].update(input_host)
+        else:
+            coalesced.append(input_host)
+            target = len(coalesced) - 1
+
+        for key in _fact_keys(coalesced[target]):
+            index.setdefault(key, set()).add(target)
+
+    return coalesced
+
+
+def _fact_keys(host):
+    return [
+        (host.account, name, json.dumps(value, sort_keys=True))
+        for name, value in host.canonical_facts.items()
+    ]
+
+
+def _canonical_facts_match(host, other):
+    if host.account != other.account:
+        return False
+
+    facts = host.canonical_facts
+    other_facts = other.canonical_facts
+    return _contains(facts, other_facts) or _contains(other_facts, facts)
+
+
+def _contains(facts, other_facts):
+    return all(
+        key in facts and facts[key] == value for key, value in other_facts.items()
+    )
+
+
+def _stage_hosts(hosts):
+    db.session.execute(
+        text(
+            f"CREATE TEMPORARY TABLE {_STAGE_TABLE} ("
+            "seq integer PRIMARY KEY, "
+            "id uuid NOT NULL, "
+            "account varchar(10) NOT NULL, "
+            "display_name varchar(200), "
+            "canonical_facts jsonb NOT NULL, "
+            "facts jsonb NOT NULL"
+            ") ON COMMIT DROP"
+        )
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for seq, host in enumerate(hosts):
+        writer.writerow(
+            (
+                seq,
+                uuid.uuid4(),
+                host.account,
+                host.display_name or None,
+                json.dumps(host.canonical_facts),
+                json.dumps(host.facts),
+            )
+        )
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {_STAGE_TABLE} ({', '.join(_STAGE_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _merge_sql():
+    hosts_table = Host.__table__.name
+    return f"""
+        WITH matched AS (
+            SELECT DISTINCT ON (s.seq) s.seq, h.id AS host_id
+            FROM {_STAGE_TABLE} s
+            JOIN {hosts_table} h ON h.account = s.account
+                AND (h.canonical_facts @> s.canonical_facts
+                     OR h.canonical_facts <@ s.canonical_facts)
+            ORDER BY s.seq
+        ), first_per_host AS (
+            SELECT DISTINCT ON (host_id) seq, host_id
+            FROM matched
+            ORDER BY host_id, seq
+        ), merged AS (
+            SELECT m.seq, m.host_id,
+                   h.canonical_facts || s.canonical_facts AS canonical_facts,
+                   COALESCE(s.display_name, h.display_name) AS display_name,
+                   CASE WHEN s.facts = '{{}}'::jsonb THEN h.facts
+                        ELSE COALESCE(h.facts, '{{}}'::jsonb) || s.facts
+                   END AS facts
+            FROM first_per_host m
+            JOIN {_STAGE_TABLE} s ON s.seq = m.seq
+            JOIN {hosts_table} h ON h.id = m.host_id
+        ), updated AS (
+            UPDATE {hosts_table} h
+            SET canonical_facts = m.canonical_facts,
+                display_name = m.display_name,
+                facts = m.facts,
+                modified_on = timezone('utc', now()),
+                last_seen = timezone('utc', now())
+            FROM merged m
+            WHERE h.id = m.host_id
+                AND (h.canonical_facts, h.display_name, h.facts)
+                    IS DISTINCT FROM (m.canonical_facts, m.display_name, m.facts)
+            RETURNING m.seq
+        ), seen AS (
+            UPDATE {hosts_table} h
+            SET last_seen = timezone('utc', now())
+            FROM merged m
+            WHERE h.id = m.host_id
+                AND (h.canonical_facts, h.display_name, h.facts)
+                    IS NOT DISTINCT FROM (m.canonical_facts, m.display_name, m.facts)
+                AND h.last_seen < timezone('utc', now())
+                    - :last_seen_interval * interval '1 second'
+        ), applied AS (
+            DELETE FROM {_STAGE_TABLE} WHERE seq IN (SELECT seq FROM merged)
+            RETURNING seq
+        )
+        SELECT (SELECT count(*) FROM applied) AS applied,
+               (SELECT count(*) FROM updated) AS updated
+    """
+
+
+def _insert_sql():
+    hosts_table = Host.__table__.name
+    return f"""
+        INSERT INTO {hosts_table}
+            (id, account, display_name, created_on, modified_on, facts, tags,
+             canonical_facts)
+        SELECT id, account, display_name, timezone('utc', now()),
+               timezone('utc', now()), facts, '[]'::jsonb, canonical_facts
+        FROM {_STAGE_TABLE}
+        ORDER BY seq
+    """
@@ -0,0 +1,63 @@
+import io
+import logging
+
+from sqlalchemy import any_, cast, column, table, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from app.models import db, Host
+
+
+DEFAULT_TEMP_TABLE_THRESHOLD = 10000
+DEFAULT_BATCH_SIZE = 1000
+
+_LOOKUP_TABLE = "host_lookup_ids"
+
+logger = logging.getLogger(__name__)
+
+
+def lookup_hosts(
+    account,
+    host_id_list,
+    temp_table_threshold=DEFAULT_TEMP_TABLE_THRESHOLD,
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    """
+    Yield the hosts of the account with the given IDs, fetching them from the
+    database in batches.
+
+    The IDs are passed as a single array parameter compared by = ANY, so the
+    lookup is one query regardless of the number of IDs.  Sets larger than the
+    threshold are copied into a temporary table joined to the hosts instead,
+    giving the planner the row count and avoiding a huge parameter.
+    """
+    query = Host.query.filter(Host.account == account)
+
+    if len(host_id_list) > temp_table_threshold:
+        logger.debug("Looking up %d hosts using a temporary table", len(host_id_list))
+        lookup_table = _stage_host_ids(host_id_list)
+        query = query.join(lookup_table, Host.id == lookup_table.c.id)
+    else:
+        ids = cast(host_id_list, ARRAY(UUID(as_uuid=True)))
+        query = query.filter(Host.id == any_(ids))
+
+    return query.yield_per(batch_size)
+
+
+def _stage_host_ids(host_id_list):
+    db.session.execute(
+        text(
+            f"CREATE TEMPORARY TABLE {_LOOKUP_TABLE} (id uuid PRIMARY KEY) "
+            "ON COMMIT DROP"
+        )
+    )
+
+    buffer = io.StringIO("".join(f"{host_id}\n" for host_id in host_id_list))
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {_LOOKUP_TABLE} (id) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+    db.session.execute(text(f"ANALYZE {_LOOKUP_TABLE}"))
+
+    return table(_LOOKUP_TABLE, column("id", UUID(as_uuid=True)))
@@ -0,0 +1,65 @@
+import logging
+
+from sqlalchemy import cast, func
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+
+from api import metrics
+from app.models import db, Host
+
+
+TAG_OPERATIONS = ("apply", "remove")
+DEFAULT_CHUNK_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def update_tags(operation, tags, filters, chunk_size=DEFAULT_CHUNK_SIZE, report=None):
+    """
+    Apply or remove the tags on the hosts matching the filters and return the
+    number of changed hosts.
+
+    Every chunk is changed by a single UPDATE statement computing the new tags
+    in the database, without loading the hosts.  The hosts that already have
+    (or lack) all of the tags are excluded, so no row is written needlessly
+    and every chunk proceeds to the hosts not changed yet.  Every chunk is
+    committed in its own transaction.  The report function, if given, is
+    called with the number of the hosts changed so far after every chunk.
+    """
+    if operation not in TAG_OPERATIONS:
+        raise ValueError(f"Invalid tag operation: {operation}")
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk size: {chunk_size}")
+
+    # Every tag is stored (and counted) once, in the order given
+    tags = list(dict.fromkeys(tags))
+    tag_array = cast(tags, ARRAY(db.Text))
+    current_tags = func.coalesce(Host.tags, cast([], JSONB))
+
+    if operation == "apply":
+        filters = filters & ~current_tags.op("@>")(cast(tags, JSONB))
+        new_tags = current_tags.op("-")(tag_array).op("||")(cast(tags, JSONB))
+    else:
+        filters = filters & Host.tags.has_any(tag_array)
+        new_tags = Host.tags.op("-")(tag_array)
+
+    updated = 0
+
+    while True:
+        chunk = db.session.query(Host.id).filter(filters).limit(chunk_size)
+        try:
+            chunk_updated = Host.query.filter(Host.id.in_(chunk.subquery())).update(
+                {Host.tags: new_tags}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        updated += chunk_updated
+        metrics.update_host_tags_count.labels(operation).inc(chunk_updated)
+        logger.debug("Changed the tags of a chunk of %d hosts", chunk_updated)
+        if report:
+            report(updated)
+
+        if chunk_updated < chunk_size:
+            return updated
@@ -0,0 +1,122 @@
+"""
+Asynchronous jobs running the long bulk operations outside of the requests.
+
+A submitted job is stored in the jobs table and processed by a worker, see
+the run_jobs command.  The workers claim the oldest queued job with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can run side by
+side.  A job is processed in chunks, every chunk committed on its own
+together with the progress, with a pause between the chunks throttling the
+load of the database.
+
+A claimed job is leased to its worker, the lease being renewed with every
+chunk.  A running job whose lease has expired, its worker having died, is
+claimed again by another worker and run from the start; the bulk operations
+skip the hosts already processed.
+"""
+import logging
+import time
+
+from datetime import datetime, timedelta
+
+from api import metrics
+from app.models import db, Job
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_LEASE_TIME = 300
+
+logger = logging.getLogger(__name__)
+
+
+def submit_job(account, operation, parameters):
+    job = Job(
+        account=account, operation=operation, parameters=parameters, status=QUEUED
+    )
+    db.session.add(job)
+    db.session.commit()
+    metrics.job_count.labels(operation, QUEUED).inc()
+    return job
+
+
+def run_next_job(
+    handlers, chunk_size=DEFAULT_CHUNK_SIZE, pause=0, lease_time=DEFAULT_LEASE_TIME
+):
+    """
+    Claim and run the oldest queued job, or running job with an expired
+    lease.  A handler is called with the account, the job parameters, the
+    chunk size and a report function taking the number of processed hosts
+    after every chunk, and returns the result.  Returns the finished job, or
+    None when no job is pending.
+    """
+    now = datetime.utcnow()
+    job = (
+        Job.query.filter(
+            (Job.status == QUEUED)
+            | ((Job.status == RUNNING) & (Job.locked_until < now))
+        )
+        .order_by(Job.created_on)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.session.rollback()
+        return None
+
+    if job.status == RUNNING:
+        logger.warning("The lease of the job %s expired, running it again", job)
+    job.status = RUNNING
+    job.started_on = now
+    job.locked_until = now + timedelta(seconds=lease_time)
+    db.session.commit()
+    logger.info("Running the job %s", job)
+
+    def report(processed):
+        job.processed = processed
+        job.locked_until = datetime.utcnow() + timedelta(seconds=lease_time)
+        db.session.commit()
+        if pause:
+            time.sleep(pause)
+
+    try:
+        job.result = handlers[job.operation](
+            job.account, job.parameters, chunk_size, report
+        )
+        job.status = COMPLETED
+    except Exception as exception:
+        db.session.rollback()
+        logger.exception("The job %s failed", job)
+        job.status = FAILED
+        job.error = str(exception)
+
+    job.finished_on = datetime.utcnow()
+    db.session.commit()
+    metrics.job_count.labels(job.operation, job.status).inc()
+    logger.info("Finished the job %s", job)
+    return job
+
+
+def run_jobs(
+    handlers,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    pause=0,
+    poll_interval=1,
+    once=False,
+    lease_time=DEFAULT_LEASE_TIME,
+):
+    """
+    Run the queued jobs, waiting for new ones unless only the currently
+    queued jobs are to be run.  Returns the number of the run jobs.
+    """
+    run = 0
+    while True:
+        if run_next_job(handlers, chunk_size, pause, lease_time):
+            run += 1
+        elif once:
+            return run
+        else:
+            time.sleep(poll_interval)
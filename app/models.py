@@ -1,9 +1,10 @@
 import uuid
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import JSONB, UUID
-from sqlalchemy import orm
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import INET, JSONB, MACADDR, TSVECTOR, UUID
+from sqlalchemy import event, orm, text
 
 from app.exceptions import InputFormatException
 
@@ -62,8 +63,32 @@ def convert_dict_to_json_facts(fact_dict):
     return fact_list
 
 
+# The full-text search document of a host, computed from the new row by the
+# search vector trigger.  Only the values of the facts are indexed, not their
+# names.  The simple configuration neither stems the words nor drops the stop
+# words, as the values are mostly names and identifiers.
+SEARCH_CONFIG = "simple"
+SEARCH_VECTOR_SQL = f"""
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.display_name, '')), 'A')
+    || setweight(jsonb_to_tsvector(
+        '{SEARCH_CONFIG}', coalesce(NEW.canonical_facts, '{{}}'), '["string", "numeric"]'
+    ), 'A')
+    || setweight(jsonb_to_tsvector(
+        '{SEARCH_CONFIG}', coalesce(NEW.facts, '{{}}'), '["string", "numeric"]'
+    ), 'B')
+"""
+
+
 class Host(db.Model):
     __tablename__ = "hosts"
+    __table_args__ = (
+        db.Index("hosts_account_id_idx", "account", "id"),
+        db.Index("hosts_account_modified_on_id_idx", "account", "modified_on", "id"),
+        db.Index("hosts_account_display_name_id_idx", "account", "display_name", "id"),
+        db.Index("hosts_account_created_on_id_idx", "account", "created_on", "id"),
+        db.Index("hosts_account_last_seen_id_idx", "account", "last_seen", "id"),
+        db.Index("hosts_search_vector_idx", "search_vector", postgresql_using="gin"),
+    )
 
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     account = db.Column(db.String(10))
@@ -72,9 +97,18 @@ class Host(db.Model):
     modified_on = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
+    # The last check-in, even one that changed nothing.  The hosts not seen
+    # for the retention period are culled.
+    last_seen = db.Column(
+        db.DateTime,
+        default=datetime.utcnow,
+        server_default=text("timezone('utc', now())"),
+    )
     facts = db.Column(JSONB)
     tags = db.Column(JSONB)
     canonical_facts = db.Column(JSONB)
+    # Maintained by the search vector trigger, never loaded with the host
+    search_vector = orm.deferred(db.Column(TSVECTOR))
 
     def __init__(
         self,
@@ -115,30 +149,72 @@ class Host(db.Model):
         return json_dict
 
     def update(self, input_host):
-
-        self.update_canonical_facts(input_host.canonical_facts)
-
-        self.update_display_name(input_host.display_name)
-
-        self.update_facts(input_host.facts)
+        """
+        Update the host with the input host data.  Only the changed fields are
+        modified, so a host that would not change is not written at all and
+        keeps its modification time.  Returns whether anything changed.
+        """
+        changed = self.update_canonical_facts(input_host.canonical_facts)
+
+        changed |= self.update_display_name(input_host.display_name)
+
+        changed |= self.update_facts(input_host.facts)
+
+        if changed:
+            self.last_seen = datetime.utcnow()
+
+        return changed
+
+    def update_last_seen(self, interval):
+        """
+        Record a check-in that changed nothing.  Only the last seen time is
+        written, at most once per interval in seconds, and the modification
+        time is kept.  Returns whether anything was written.
+        """
+        now = datetime.utcnow()
+        if self.last_seen and now - self.last_seen < timedelta(seconds=interval):
+            return False
+
+        # Setting the modification time to itself keeps it from the onupdate
+        Host.query.filter(Host.id == self.id).update(
+            {Host.last_seen: now, Host.modified_on: Host.modified_on},
+            synchronize_session=False,
+        )
+        orm.attributes.set_committed_value(self, "last_seen", now)
+        return True
 
     def update_display_name(self, display_name):
-        if display_name:
+        if display_name and display_name != self.display_name:
             self.display_name = display_name
+            return True
+        return False
 
     def update_canonical_facts(self, canonical_facts):
         # FIXME: make sure new canonical facts are added
+        if all(
+            self.canonical_facts.get(name) == value
+            for name, value in canonical_facts.items()
+        ):
+            return False
+
         self.canonical_facts.update(canonical_facts)
         orm.attributes.flag_modified(self, "canonical_facts")
+        return True
 
     def update_facts(self, facts_dict):
-        if facts_dict:
-            if not self.facts:
-                self.facts = facts_dict
-                return
+        if not facts_dict:
+            return False
 
-            for input_namespace, input_facts in facts_dict.items():
+        if not self.facts:
+            self.facts = facts_dict
+            return True
+
+        changed = False
+        for input_namespace, input_facts in facts_dict.items():
+            if self.facts.get(input_namespace) != input_facts:
                 self.replace_facts_in_namespace(input_namespace, input_facts)
+                changed = True
+        return changed
 
     def replace_facts_in_namespace(self, namespace, facts_dict):
         self.facts[namespace] = facts_dict
@@ -164,3 +240,362 @@ class Host(db.Model):
             self.facts,
             self.tags,
         )
+
+
+class HostArchive(db.Model):
+    """
+    A compact record of a host culled from the hosts table.  The facts are
+    not archived.
+    """
+    __tablename__ = "hosts_archive"
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True)
+    account = db.Column(db.String(10))
+    display_name = db.Column(db.String(200))
+    created_on = db.Column(db.DateTime)
+    modified_on = db.Column(db.DateTime)
+    archived_on = db.Column(db.DateTime, default=datetime.utcnow)
+    tags = db.Column(JSONB)
+    canonical_facts = db.Column(JSONB)
+
+    def __repr__(self):
+        tmpl = "<HostArchive '%s' '%s' canonical_facts=%s>"
+        return tmpl % (self.display_name, self.id, self.canonical_facts)
+
+
+class Job(db.Model):
+    """
+    An asynchronous bulk operation on the hosts of an account, see app.jobs.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Only the jobs a worker can claim are indexed
+        db.Index(
+            "jobs_pending_created_on_idx",
+            "created_on",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    account = db.Column(db.String(10), nullable=False)
+    operation = db.Column(db.String(50), nullable=False)
+    parameters = db.Column(JSONB, nullable=False)
+    status = db.Column(db.String(10), nullable=False)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(JSONB)
+    error = db.Column(db.Text)
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    started_on = db.Column(db.DateTime)
+    finished_on = db.Column(db.DateTime)
+    # A running job past its lease is claimed again, its worker being gone
+    locked_until = db.Column(db.DateTime)
+
+    def to_json(self):
+        return {
+            "id": str(self.id),
+            "operation": self.operation,
+            "parameters": self.parameters,
+            "status": self.status,
+            "processed": self.processed,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created_on,
+            "started": self.started_on,
+            "finished": self.finished_on,
+        }
+
+    def __repr__(self):
+        return "<Job '%s' '%s' status=%s>" % (self.id, self.operation, self.status)
+
+
+class HostTagCount(db.Model):
+    """
+    A number of hosts of an account carrying a tag.  Maintained by triggers
+    on the hosts table, see _create_tag_count_triggers.
+    """
+    __tablename__ = "host_tag_counts"
+    __table_args__ = (
+        # Only the transiently unused tags to be deleted are indexed
+        db.Index(
+            "host_tag_counts_unused_idx",
+            "account",
+            postgresql_where=text("count <= 0"),
+        ),
+    )
+
+    account = db.Column(db.String(10), primary_key=True)
+    tag = db.Column(db.Text, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    def to_json(self):
+        return {"tag": self.tag, "count": self.count}
+
+    def __repr__(self):
+        return "<HostTagCount '%s' '%s' count=%d>" % (self.account, self.tag, self.count)
+
+
+class HostIpAddress(db.Model):
+    """
+    An IP address of a host from its canonical facts, stored as a native
+    network type, so the hosts can be looked up by an address or a network.
+    Maintained by triggers on the hosts table, see _create_address_triggers.
+    """
+    __tablename__ = "host_ip_addresses"
+    __table_args__ = (
+        # Serves both the exact matches and the network containment (<<=)
+        db.Index("host_ip_addresses_account_address_idx", "account", "address"),
+    )
+
+    host_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey(Host.id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    address = db.Column(INET, primary_key=True)
+    account = db.Column(db.String(10), nullable=False)
+
+    def __repr__(self):
+        return "<HostIpAddress '%s' '%s'>" % (self.host_id, self.address)
+
+
+class HostMacAddress(db.Model):
+    """
+    A MAC address of a host from its canonical facts, see HostIpAddress.
+    """
+    __tablename__ = "host_mac_addresses"
+    __table_args__ = (
+        db.Index("host_mac_addresses_account_address_idx", "account", "address"),
+    )
+
+    host_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey(Host.id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    address = db.Column(MACADDR, primary_key=True)
+    account = db.Column(db.String(10), nullable=False)
+
+    def __repr__(self):
+        return "<HostMacAddress '%s' '%s'>" % (self.host_id, self.address)
+
+
+# The transition tables of the statement level triggers holding the changed
+# hosts, and the sign of their tags in the tag counts
+_TAG_COUNT_TRIGGER_ROWS = {
+    "INSERT": (("NEW", 1),),
+    "UPDATE": (("NEW", 1), ("OLD", -1)),
+    "DELETE": (("OLD", -1),),
+}
+
+
+def _tag_count_trigger_sql(hosts_table, counts_table, operation):
+    transition_tables = _TAG_COUNT_TRIGGER_ROWS[operation]
+    changed_tags = " UNION ALL ".join(
+        f"SELECT DISTINCT h.id, h.account, t.tag, {sign} AS delta "
+        f"FROM {rows.lower()}_rows h, "
+        "jsonb_array_elements_text(coalesce(h.tags, '[]')) t(tag) "
+        "WHERE h.account IS NOT NULL"
+        for rows, sign in transition_tables
+    )
+    referencing = " ".join(
+        f"{rows} TABLE AS {rows.lower()}_rows" for rows, _ in transition_tables
+    )
+    name = f"{hosts_table}_tag_counts_{operation.lower()}"
+    return f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO {counts_table} (account, tag, count)
+            SELECT account, tag, sum(delta)
+            FROM ({changed_tags}) changed_tags
+            GROUP BY account, tag
+            HAVING sum(delta) <> 0
+            ORDER BY account, tag
+            ON CONFLICT (account, tag)
+            DO UPDATE SET count = {counts_table}.count + excluded.count;
+
+            DELETE FROM {counts_table} WHERE count <= 0;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS {name} ON {hosts_table};
+        CREATE TRIGGER {name}
+            AFTER {operation} ON {hosts_table}
+            REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION {name}();
+    """
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_tag_count_triggers(target, connection, **kw):
+    """
+    Keep the tag counts up to date.  The statement level triggers aggregate
+    the tags of all hosts changed by a statement, so a bulk change updates
+    every tag count once.
+    """
+    for operation in _TAG_COUNT_TRIGGER_ROWS:
+        connection.execute(
+            text(
+                _tag_count_trigger_sql(
+                    Host.__table__.name, HostTagCount.__table__.name, operation
+                )
+            )
+        )
+
+
+@event.listens_for(db.metadata, "after_drop")
+def _drop_tag_count_triggers(target, connection, **kw):
+    for operation in _TAG_COUNT_TRIGGER_ROWS:
+        name = f"{Host.__table__.name}_tag_counts_{operation.lower()}"
+        connection.execute(text(f"DROP FUNCTION IF EXISTS {name}()"))
+
+
+# The address tables by the canonical fact they are extracted from
+_ADDRESS_MODELS = {"ip_addresses": HostIpAddress, "mac_addresses": HostMacAddress}
+
+# The hosts with new addresses.  The deleted hosts are removed by the foreign
+# keys.
+_ADDRESS_TRIGGER_HOSTS = {
+    "INSERT": "SELECT id, account, canonical_facts FROM new_rows",
+    "UPDATE": (
+        "SELECT n.id, n.account, n.canonical_facts "
+        "FROM new_rows n JOIN old_rows o ON o.id = n.id "
+        "WHERE n.canonical_facts IS DISTINCT FROM o.canonical_facts "
+        "OR n.account IS DISTINCT FROM o.account"
+    ),
+}
+
+
+def _address_type(model):
+    return model.__table__.c.address.type.compile(dialect=postgresql.dialect())
+
+
+def _address_conversion_name(hosts_table, model):
+    return f"{hosts_table}_to_{_address_type(model).lower()}"
+
+
+def _address_conversion_sql(hosts_table, model):
+    """
+    A conversion of a canonical fact value to the address type.  An invalid
+    value is skipped instead of failing the host change.
+    """
+    address_type = _address_type(model)
+    return f"""
+        CREATE OR REPLACE FUNCTION {_address_conversion_name(hosts_table, model)}(
+            value text
+        ) RETURNS {address_type} AS $$
+        BEGIN
+            RETURN value::{address_type};
+        EXCEPTION WHEN invalid_text_representation THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE STRICT;
+    """
+
+
+def _address_trigger_sql(hosts_table, operation):
+    changed_hosts = _ADDRESS_TRIGGER_HOSTS[operation]
+    statements = []
+    for fact, model in _ADDRESS_MODELS.items():
+        addresses_table = model.__table__.name
+        if operation == "UPDATE":
+            statements.append(
+                f"DELETE FROM {addresses_table} WHERE host_id IN "
+                f"(SELECT id FROM ({changed_hosts}) changed_hosts);"
+            )
+        statements.append(f"""
+            INSERT INTO {addresses_table} (host_id, account, address)
+            SELECT DISTINCT h.id, h.account, a.address
+            FROM ({changed_hosts}) h CROSS JOIN LATERAL (
+                SELECT {_address_conversion_name(hosts_table, model)}(value) AS address
+                FROM jsonb_array_elements_text(
+                    CASE jsonb_typeof(h.canonical_facts -> '{fact}')
+                    WHEN 'array' THEN h.canonical_facts -> '{fact}'
+                    ELSE '[]' END
+                )
+            ) a
+            WHERE h.account IS NOT NULL AND a.address IS NOT NULL;
+        """)
+
+    referencing = "NEW TABLE AS new_rows"
+    if operation == "UPDATE":
+        referencing = "OLD TABLE AS old_rows " + referencing
+    name = f"{hosts_table}_addresses_{operation.lower()}"
+    body = "\n".join(statements)
+    return f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+        BEGIN
+            {body}
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS {name} ON {hosts_table};
+        CREATE TRIGGER {name}
+            AFTER {operation} ON {hosts_table}
+            REFERENCING {referencing}
+            FOR EACH STATEMENT EXECUTE FUNCTION {name}();
+    """
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_address_triggers(target, connection, **kw):
+    """
+    Keep the address tables in sync with the canonical facts of the hosts,
+    whichever way the hosts are changed.
+    """
+    hosts_table = Host.__table__.name
+    for model in _ADDRESS_MODELS.values():
+        connection.execute(text(_address_conversion_sql(hosts_table, model)))
+    for operation in _ADDRESS_TRIGGER_HOSTS:
+        connection.execute(text(_address_trigger_sql(hosts_table, operation)))
+
+
+@event.listens_for(db.metadata, "after_drop")
+def _drop_address_triggers(target, connection, **kw):
+    hosts_table = Host.__table__.name
+    for operation in _ADDRESS_TRIGGER_HOSTS:
+        name = f"{hosts_table}_addresses_{operation.lower()}"
+        connection.execute(text(f"DROP FUNCTION IF EXISTS {name}()"))
+    for model in _ADDRESS_MODELS.values():
+        name = _address_conversion_name(hosts_table, model)
+        connection.execute(text(f"DROP FUNCTION IF EXISTS {name}(text)"))
+
+
+# The columns the search document is computed from
+_SEARCH_VECTOR_COLUMNS = ("display_name", "canonical_facts", "facts")
+
+
+def _search_vector_trigger_sql(hosts_table):
+    name = f"{hosts_table}_search_vector"
+    columns = ", ".join(_SEARCH_VECTOR_COLUMNS)
+    return f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS {name} ON {hosts_table};
+        CREATE TRIGGER {name}
+            BEFORE INSERT OR UPDATE OF {columns} ON {hosts_table}
+            FOR EACH ROW EXECUTE FUNCTION {name}();
+    """
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_search_vector_trigger(target, connection, **kw):
+    """
+    Keep the search document up to date.  Unlike a generated column, it is
+    only computed again when a column it is computed from is updated, not by
+    the check-ins updating only the last check-in time or the tag changes.
+    """
+    connection.execute(text(_search_vector_trigger_sql(Host.__table__.name)))
+
+
+@event.listens_for(db.metadata, "after_drop")
+def _drop_search_vector_trigger(target, connection, **kw):
+    name = f"{Host.__table__.name}_search_vector"
+    connection.execute(text(f"DROP FUNCTION IF EXISTS {name}()"))
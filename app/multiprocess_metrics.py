@@ -0,0 +1,112 @@
+"""
+Maintenance of the Prometheus multiprocess mode metric files.
+
+Every worker process writes its metrics into its own files, which are all
+read on every scrape.  The files of the exited workers are not removed,
+because their counters are part of the totals, so with recycled workers the
+scrapes get slower over time.  The compaction merges the files of the dead
+processes into a single aggregate file per metric type.  A file lock keeps
+the scrapes from reading the files while they are being merged.
+"""
+import fcntl
+import glob
+import os
+
+from collections import defaultdict
+from contextlib import contextmanager
+from operator import itemgetter
+
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+from prometheus_client.mmap_dict import MmapedDict
+
+
+AGGREGATE = "aggregate"
+LOCK_FILE = ".compaction.lock"
+
+
+def _merge_sum(first, second):
+    return first[0] + second[0], max(first[1], second[1])
+
+
+# How the (value, timestamp) pairs of the same sample are merged, by the file
+# name prefix.  The "all" gauges are reported per process and the "live"
+# gauges are removed when the process dies, so neither is compacted.
+_MERGES = {
+    "counter": _merge_sum,
+    "histogram": _merge_sum,
+    "summary": _merge_sum,
+    "gauge_sum": _merge_sum,
+    "gauge_min": lambda first, second: min(first, second, key=itemgetter(0)),
+    "gauge_max": lambda first, second: max(first, second, key=itemgetter(0)),
+    "gauge_mostrecent": lambda first, second: max(first, second, key=itemgetter(1)),
+}
+
+
+def metrics_directory():
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR", os.environ.get("prometheus_multiproc_dir"))
+
+
+def generate_metrics(directory):
+    """
+    The metrics of all the processes in the Prometheus text format.
+    """
+    with _lock(directory, fcntl.LOCK_SH):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, directory)
+        return generate_latest(registry)
+
+
+def compact(directory, pids):
+    """
+    Merge the metric files of the given dead processes into the aggregate
+    files.  Returns the number of the removed files.
+    """
+    pids = {str(pid) for pid in pids}
+    dead_files = defaultdict(list)
+    with _lock(directory, fcntl.LOCK_EX):
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            prefix, _, pid = os.path.basename(path)[:-len(".db")].rpartition("_")
+            if pid in pids and prefix in _MERGES:
+                dead_files[prefix].append(path)
+
+        for prefix, paths in dead_files.items():
+            _merge_files(directory, prefix, paths)
+            for path in paths:
+                os.remove(path)
+
+    return sum(len(paths) for paths in dead_files.values())
+
+
+def _merge_files(directory, prefix, paths):
+    merge = _MERGES[prefix]
+    aggregate_path = os.path.join(directory, f"{prefix}_{AGGREGATE}.db")
+    if os.path.exists(aggregate_path):
+        paths = [aggregate_path] + paths
+
+    samples = {}
+    for path in paths:
+        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(path):
+            sample = (value, timestamp)
+            samples[key] = merge(samples[key], sample) if key in samples else sample
+
+    # Not matching *.db, the file is not read until complete
+    temporary_path = aggregate_path + ".tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    aggregate = MmapedDict(temporary_path)
+    try:
+        for key, (value, timestamp) in samples.items():
+            aggregate.write_value(key, value, timestamp)
+    finally:
+        aggregate.close()
+    os.replace(temporary_path, aggregate_path)
+
+
+@contextmanager
+def _lock(directory, operation):
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,98 @@
+"""
+An opt-in CPU profiler of the API operations.
+
+When enabled, the API operations are wrapped when they are resolved, and a
+request is profiled either when it is sampled or when it carries the profiling
+token in a header.  Every profile is written as a cProfile (pstats) file to a
+directory per operation, where it can be read by pstats, snakeviz or
+converted to a flame graph by flameprof.  When disabled, the operations are
+not wrapped at all.
+"""
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import random
+
+from datetime import datetime
+from flask import request
+
+
+PROFILE_HEADER = "x-inventory-profile"
+PROFILE_SUFFIX = ".prof"
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    def __init__(self, directory, sample_rate=0.0, token=None, max_files=100):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.max_files = max_files
+
+    def wrap(self, operation_id, function):
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            if not self._should_profile():
+                return function(*args, **kwargs)
+
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                self._dump(operation_id, profile)
+
+        return profiled
+
+    def _should_profile(self):
+        token = request.headers.get(PROFILE_HEADER)
+        if token and self.token and hmac.compare_digest(token, self.token):
+            return True
+        return random.random() < self.sample_rate
+
+    def _dump(self, operation_id, profile):
+        directory = os.path.join(self.directory, operation_id)
+        file_name = "%s-%d%s" % (
+            datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"),
+            os.getpid(),
+            PROFILE_SUFFIX,
+        )
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profile.dump_stats(os.path.join(directory, file_name))
+            self._remove_old_profiles(directory)
+        except OSError:
+            logger.exception("Unable to store the profile of %s", operation_id)
+        else:
+            logger.info("Stored the profile of %s as %s", operation_id, file_name)
+
+    def _remove_old_profiles(self, directory):
+        # The file names start with a timestamp, so they sort by age
+        file_names = list_profiles(directory)
+        for file_name in file_names[: max(len(file_names) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except FileNotFoundError:
+                pass  # Removed by another worker
+
+
+def create_profiler(config):
+    if not config.profile_dir or not (config.profile_sample_rate or config.profile_token):
+        return None
+
+    return Profiler(
+        config.profile_dir,
+        config.profile_sample_rate,
+        config.profile_token,
+        config.profile_max_files,
+    )
+
+
+def list_profiles(directory):
+    try:
+        file_names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in file_names if name.endswith(PROFILE_SUFFIX))
@@ -0,0 +1,193 @@
+"""
+Per-account rate limits and concurrency caps of the API operations.
+
+The limits are configured per operation and counted per account, so a single
+account looping on an operation can not starve the others.  The counters are
+kept in a storage shared by all the worker processes, e.g. Redis, with
+memory:// counting within a single process only.  A request over a limit is
+rejected with 429 Too Many Requests and a Retry-After header.  When no limits
+are configured, the operations are not wrapped at all.
+
+The coroutine views of the asynchronous application are limited the same
+way, counted in the same storage, see wrap_async.
+"""
+import functools
+import logging
+import math
+import time
+
+from connexion.exceptions import ProblemException
+from flask import Response
+from limits import parse_many
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+from werkzeug.wsgi import ClosingIterator
+
+from api import metrics
+from app.auth import peek_account_number
+
+
+DEFAULT_OPERATION = "default"
+MIN_RETRY_AFTER = 1
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    def __init__(self, storage_uri, rate_limits, concurrency_limits, concurrency_timeout=60):
+        self.storage = storage_from_string(storage_uri)
+        self.strategy = FixedWindowRateLimiter(self.storage)
+        self.rate_limits = {
+            operation: parse_many(limits) for operation, limits in rate_limits.items()
+        }
+        self.concurrency_limits = concurrency_limits
+        self.concurrency_timeout = concurrency_timeout
+
+    def wrap(self, operation_id, function):
+        operation, rate_limits, concurrency_limit = self._operation_limits(operation_id)
+        if not rate_limits and not concurrency_limit:
+            return function
+
+        @functools.wraps(function)
+        def limited(*args, **kwargs):
+            account_number = peek_account_number()
+            if account_number is None:
+                # Rejected by requires_identity
+                return function(*args, **kwargs)
+
+            key = f"{operation}/{account_number}"
+            self._enter(operation, key, rate_limits, concurrency_limit)
+            if not concurrency_limit:
+                return function(*args, **kwargs)
+            try:
+                response = function(*args, **kwargs)
+            except BaseException:
+                self._release_slot(key)
+                raise
+
+            if isinstance(response, Response) and response.is_streamed:
+                # The work is done while the body is streamed, so the slot
+                # is held until the response is closed.  The body itself is
+                # wrapped, the call_on_close functions being skipped for a
+                # direct passthrough response.
+                response.response = ClosingIterator(
+                    response.response, lambda: self._release_slot(key)
+                )
+            else:
+                self._release_slot(key)
+            return response
+
+        return limited
+
+    def wrap_async(self, operation_id, function):
+        """
+        The wrap counterpart for the coroutine views of the asynchronous
+        application, taking the identity from the headers of the aiohttp
+        request.  The counters are checked synchronously, which for a Redis
+        storage is a round trip blocking the event loop.
+        """
+        operation, rate_limits, concurrency_limit = self._operation_limits(operation_id)
+        if not rate_limits and not concurrency_limit:
+            return function
+
+        @functools.wraps(function)
+        async def limited(request, *args, **kwargs):
+            account_number = peek_account_number(request.headers)
+            if account_number is None:
+                # Rejected by requires_identity_async
+                return await function(request, *args, **kwargs)
+
+            key = f"{operation}/{account_number}"
+            self._enter(operation, key, rate_limits, concurrency_limit)
+            if not concurrency_limit:
+                return await function(request, *args, **kwargs)
+            # Unlike a streamed Flask response, an aiohttp StreamResponse is
+            # written before the view returns, so the slot is held until then
+            try:
+                return await function(request, *args, **kwargs)
+            finally:
+                self._release_slot(key)
+
+        return limited
+
+    def _operation_limits(self, operation_id):
+        operation = operation_id.rsplit(".", 1)[-1]
+        rate_limits = self._operation_limit(self.rate_limits, operation) or []
+        concurrency_limit = self._operation_limit(self.concurrency_limits, operation)
+        return operation, rate_limits, concurrency_limit
+
+    @staticmethod
+    def _operation_limit(limits, operation):
+        return limits.get(operation, limits.get(DEFAULT_OPERATION))
+
+    def _enter(self, operation, key, rate_limits, concurrency_limit):
+        """
+        Counts the request against the limits, taking a concurrency slot to be
+        released when the request is done.  Raises 429 when a limit is
+        exceeded.
+        """
+        retry_after = self._hit_rate_limits(key, rate_limits)
+        if retry_after:
+            raise _too_many_requests(operation, "rate", retry_after)
+
+        if concurrency_limit and not self._acquire_slot(key, concurrency_limit):
+            raise _too_many_requests(operation, "concurrency", MIN_RETRY_AFTER)
+
+    def _hit_rate_limits(self, key, rate_limits):
+        """
+        Counts the request against the rate limits.  Returns the seconds until
+        the exceeded limit resets, or None when no limit is exceeded.
+        """
+        try:
+            for limit in rate_limits:
+                if not self.strategy.hit(limit, "rate", key):
+                    reset_time = self.strategy.get_window_stats(limit, "rate", key)[0]
+                    return max(MIN_RETRY_AFTER, math.ceil(reset_time - time.time()))
+        except Exception:
+            # Do not turn a storage outage into an API outage
+            logger.exception("Unable to check the rate limits of %s", key)
+        return None
+
+    def _acquire_slot(self, key, concurrency_limit):
+        # The counter expires after the timeout, so slots leaked by killed
+        # workers are eventually freed
+        slot_key = f"concurrency/{key}"
+        try:
+            if self.storage.incr(slot_key, self.concurrency_timeout) <= concurrency_limit:
+                return True
+            self.storage.incr(slot_key, self.concurrency_timeout, amount=-1)
+            return False
+        except Exception:
+            logger.exception("Unable to check the concurrency limit of %s", key)
+            return True
+
+    def _release_slot(self, key):
+        slot_key = f"concurrency/{key}"
+        try:
+            if self.storage.incr(slot_key, self.concurrency_timeout, amount=-1) < 0:
+                # The counter expired while the request was running
+                self.storage.clear(slot_key)
+        except Exception:
+            logger.exception("Unable to release the concurrency slot of %s", key)
+
+
+def create_rate_limiter(config):
+    if not config.rate_limits and not config.concurrency_limits:
+        return None
+
+    return RateLimiter(
+        config.rate_limit_storage_uri,
+        config.rate_limits,
+        config.concurrency_limits,
+        config.concurrency_timeout,
+    )
+
+
+def _too_many_requests(operation, limit_type, retry_after):
+    metrics.rate_limited_request_count.labels(operation, limit_type).inc()
+    return ProblemException(
+        status=429,
+        title="Too Many Requests",
+        detail=f"The {limit_type} limit of {operation} for the account was exceeded.",
+        headers={"Retry-After": str(retry_after)},
+    )
@@ -0,0 +1,117 @@
+"""
+A breakdown of the request processing time into phases.
+
+The time of every request is split into the phases below. They are returned
+in the Server-Timing response header and observed by a Prometheus histogram
+per phase.
+
+* validation – routing, connexion parameter parsing and request validation
+* identity – decoding and validating the identity header
+* db – executing the SQL statements, including the network round trips
+* orm – building the ORM objects from the query results
+* serialization – converting the hosts to JSON, serializing and validating the
+  response
+* total – the whole request
+"""
+import functools
+import time
+
+from contextlib import contextmanager
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api import metrics
+
+
+PHASES = ("validation", "identity", "db", "orm", "serialization", "total")
+
+
+def init_app(flask_app):
+    flask_app.before_request(_start_request)
+    flask_app.after_request(_finish_request)
+
+
+def wrap(operation_id, function):
+    """
+    Wrap an API operation to tell the validation and serialization done by
+    connexion before and after it.
+    """
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        if _timings() is not None:
+            _add("validation", time.perf_counter() - g.request_start)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            g.operation_end = time.perf_counter()
+
+    return timed
+
+
+@contextmanager
+def phase(name, exclude=None):
+    """
+    Add the time spent in the block to a phase.  The time of the excluded
+    phase spent in the block, e.g. the SQL execution within an ORM query, is
+    not counted twice.
+    """
+    timings = _timings()
+    if timings is None:
+        yield
+        return
+
+    excluded_start = timings.get(exclude, 0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        excluded = timings.get(exclude, 0.0) - excluded_start
+        _add(name, time.perf_counter() - start - excluded)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.inventory_execute_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings() is not None:
+        _add("db", time.perf_counter() - context.inventory_execute_start)
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.phase_timings = {}
+
+
+def _finish_request(response):
+    timings = _timings()
+    if timings is None:
+        return response
+
+    now = time.perf_counter()
+    if "operation_end" in g:
+        _add("serialization", now - g.operation_end)
+    timings["total"] = now - g.request_start
+
+    for name in PHASES:
+        if name in timings:
+            metrics.request_phase_time.labels(name).observe(timings[name])
+
+    response.headers["Server-Timing"] = ", ".join(
+        "%s;dur=%.3f" % (name, timings[name] * 1000) for name in PHASES if name in timings
+    )
+    return response
+
+
+def _timings():
+    if not has_request_context():
+        return None
+    return g.get("phase_timings")
+
+
+def _add(name, duration):
+    timings = g.phase_timings
+    timings[name] = timings.get(name, 0.0) + duration
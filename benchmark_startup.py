@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Measures how long it takes a gunicorn worker to become ready to serve
+requests, with and without the application preloaded in the master process.
+
+Without preloading every worker imports the application and builds it from
+the API specification.  With preloading the worker is only forked from the
+master and drops the inherited database connections.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from timeit import timeit
+
+os.environ.setdefault("APP_SETTINGS", "testing")
+
+RUNS = 10
+
+
+def _report(title, durations):
+    print(
+        "%-40s median %8.2f ms   min %8.2f ms   max %8.2f ms"
+        % (
+            title,
+            statistics.median(durations) * 1000,
+            min(durations) * 1000,
+            max(durations) * 1000,
+        )
+    )
+
+
+def benchmark_spec_parsing():
+    import app
+
+    def parse_yaml():
+        os.remove(app._spec_cache_path())
+        app._parse_spec()
+
+    def load_cached():
+        app._parse_spec()
+
+    app._parse_spec()  # Warm up the file system cache
+    yaml_durations = [timeit(parse_yaml, number=1) for _ in range(RUNS)]
+    load_cached()  # Make sure the cache is populated
+    cached_durations = [timeit(load_cached, number=1) for _ in range(RUNS)]
+
+    _report("Spec: parse YAML (cache miss)", yaml_durations)
+    _report("Spec: load cached JSON", cached_durations)
+
+
+def benchmark_worker_without_preload():
+    code = "import time; start = time.perf_counter(); import run; print(time.perf_counter() - start)"
+    durations = []
+    for _ in range(RUNS):
+        output = subprocess.run(
+            (sys.executable, "-c", code), check=True, stdout=subprocess.PIPE
+        ).stdout
+        durations.append(float(output.splitlines()[-1]))
+    _report("Worker boot without preload", durations)
+
+
+def benchmark_worker_with_preload():
+    from app import db
+    from run import application
+
+    # Open a connection in the master the same way a preloaded app might
+    with application.app_context():
+        db.engine.connect().close()
+
+    durations = []
+    for _ in range(RUNS):
+        read_fd, write_fd = os.pipe()
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            with application.app_context():
+                db.get_engine().dispose(close=False)
+            os.write(write_fd, b"x")
+            os._exit(0)
+
+        os.close(write_fd)
+        os.read(read_fd, 1)
+        durations.append(time.perf_counter() - start)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+    _report("Worker boot with preload", durations)
+
+
+if __name__ == "__main__":
+    benchmark_spec_parsing()
+    benchmark_worker_without_preload()
+    benchmark_worker_with_preload()
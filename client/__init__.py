@@ -0,0 +1,9 @@
+"""
+A Python client of the Host Inventory API.  It does not depend on the
+application, only on the requests library.
+"""
+from client.host import HostWrapper
+from client.session import build_identity_header, InventoryClient
+
+
+__all__ = ["build_identity_header", "HostWrapper", "InventoryClient"]
@@ -0,0 +1,168 @@
+import collections
+import json
+
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from client.host import HostWrapper
+
+
+DEFAULT_BASE_URL = "http://localhost:8080/r/insights/platform/inventory/api/v1"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+LOOKUP_CHUNK_SIZE = 10000
+
+
+class InventoryClient:
+    """
+    A client of the Host Inventory API.
+
+    All requests go through a single session keeping up to pool_size
+    keep-alive connections open, so consecutive and concurrent requests do
+    not open new connections.  The client is thread-safe and meant to be
+    shared by the whole process.
+    """
+
+    def __init__(
+        self,
+        base_url=DEFAULT_BASE_URL,
+        account_number=None,
+        identity_header=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        max_retries=3,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=max_retries
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        if identity_header is None and account_number is not None:
+            identity_header = build_identity_header(account_number)
+        if identity_header is not None:
+            self.session.headers["x-rh-identity"] = identity_header
+
+        self._executor = None
+
+    def add_host(self, host):
+        """
+        Create or update a host, return the stored host.
+        """
+        return HostWrapper(self._request("POST", "/hosts", json=_host_data(host)))
+
+    def add_hosts(self, hosts, max_in_flight=None):
+        """
+        Create or update many hosts, yield the stored hosts in the input
+        order.  Up to max_in_flight requests (the pool size by default) are
+        sent concurrently over the pooled connections, so the upload is not
+        bound by the latency of every single request.  The input may be a
+        lazy iterable, at most max_in_flight hosts are held at a time.
+        """
+        max_in_flight = max_in_flight or self.pool_size
+        in_flight = collections.deque()
+
+        for host in hosts:
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+            in_flight.append(self._get_executor().submit(self.add_host, host))
+
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def get_hosts(self, host_ids):
+        """
+        Get the hosts by their IDs.  Returns a (hosts, missing IDs) tuple.
+        The IDs are sent in the request body, many thousands per request.
+        """
+        host_ids = list(host_ids)
+        hosts = []
+        missing = []
+        for start in range(0, len(host_ids), LOOKUP_CHUNK_SIZE):
+            chunk = host_ids[start:start + LOOKUP_CHUNK_SIZE]
+            response = self._request("POST", "/hosts/lookup", json={"ids": chunk})
+            hosts.extend(HostWrapper(host) for host in response["results"])
+            missing.extend(response["missing"])
+        return hosts, missing
+
+    def iter_hosts(self, per_page=100, **params):
+        """
+        Iterate over all hosts matching the list filters (tag, display_name,
+        updated_since, order_by, order_how), fetching them page by page.
+        """
+        page = 1
+        while True:
+            response = self._request(
+                "GET", "/hosts", params={**params, "page": page, "per_page": per_page}
+            )
+            for host in response["results"]:
+                yield HostWrapper(host)
+
+            if page * per_page >= response["total"]:
+                return
+            page += 1
+
+    def iter_changes(self, cursor=None, updated_since=None, limit=1000):
+        """
+        Iterate over the pages of the host change feed until the latest
+        change, yielding (cursor, hosts) tuples.  Store the cursor once the
+        hosts are processed and pass it to the next call to continue.
+        """
+        while True:
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            elif updated_since:
+                params["updated_since"] = updated_since
+
+            response = self._request("GET", "/hosts/changes", params=params)
+            if not response["results"]:
+                return
+
+            cursor = response["cursor"]
+            yield cursor, [HostWrapper(host) for host in response["results"]]
+
+            if response["count"] < limit:
+                return
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        return self._executor
+
+    def _request(self, method, path, **kwargs):
+        response = self.session.request(
+            method, self.base_url + path, timeout=self.timeout, **kwargs
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def build_identity_header(account_number):
+    identity = {"identity": {"account_number": account_number}}
+    return b64encode(json.dumps(identity).encode()).decode()
+
+
+def _host_data(host):
+    return host.data() if isinstance(host, HostWrapper) else host
@@ -1,4 +1,44 @@
+import os
+import time
+
 from prometheus_client import multiprocess
 
+# Build the application once in the master process instead of in every
+# worker, which makes the workers boot faster and share the loaded code.
+preload_app = os.getenv("INVENTORY_PRELOAD_APP", "false").lower() == "true"
+
+# The metric files of the exited workers are merged at most this often
+_metrics_compaction_interval = int(os.getenv("INVENTORY_METRICS_COMPACTION_INTERVAL", "300"))
+_dead_worker_pids = []
+_last_metrics_compaction = time.monotonic()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import db
+        from run import application
+
+        # The forked worker must not reuse database connections opened by the
+        # master.  Drop them from the pool without closing the sockets the
+        # master still owns.
+        with application.app_context():
+            db.get_engine().dispose(close=False)
+
+
 def child_exit(server, worker):
+    global _last_metrics_compaction
+
     multiprocess.mark_process_dead(worker.pid)
+    _dead_worker_pids.append(worker.pid)
+
+    if time.monotonic() - _last_metrics_compaction >= _metrics_compaction_interval:
+        from app.multiprocess_metrics import compact, metrics_directory
+
+        try:
+            removed = compact(metrics_directory(), _dead_worker_pids)
+        except OSError:
+            server.log.exception("Unable to compact the metric files")
+        else:
+            server.log.info("Compacted %d metric files of exited workers", removed)
+            _dead_worker_pids.clear()
+        _last_metrics_compaction = time.monotonic()
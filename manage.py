@@ -1,8 +1,15 @@
 import os
+import time
+from prometheus_client import multiprocess
 from flask_script import Manager  # class for handling a set of commands
 from flask_migrate import Migrate, MigrateCommand
 from app import db, create_app
 from app import models
+from app import culling
+from app import host_import
+from app import jobs
+from app.multiprocess_metrics import metrics_directory
+from api.jobs import HANDLERS as JOB_HANDLERS
 
 # import models
 
@@ -14,5 +21,75 @@ manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
 
+@manager.option('-f', '--file', dest='path', required=True,
+                help='An NDJSON file with one host per line')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=host_import.DEFAULT_BATCH_SIZE,
+                help='A number of hosts merged in a single transaction')
+@manager.option('-c', '--checkpoint', dest='checkpoint', default=None,
+                help='A file to store the progress in, allowing to resume '
+                     'an interrupted import')
+def import_hosts(path, batch_size, checkpoint):
+    """Import hosts from an NDJSON file"""
+    def report(progress):
+        print("Processed %d lines: %d created, %d updated, %d unchanged, "
+              "%d skipped" % (progress.lines, progress.created,
+                              progress.updated, progress.unchanged,
+                              progress.skipped))
+
+    host_import.import_hosts(
+        path, batch_size, checkpoint, report,
+        app.config["INVENTORY_CONFIG"].last_seen_interval)
+
+
+@manager.option('-d', '--delete', dest='delete', action='store_true',
+                default=False,
+                help='Delete the stale hosts instead of archiving them')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int,
+                default=culling.DEFAULT_BATCH_SIZE,
+                help='A number of hosts culled in a single transaction')
+@manager.option('-p', '--pause', dest='pause', type=float, default=0,
+                help='Seconds to wait between the batches')
+@manager.option('-i', '--interval', dest='interval', type=float, default=None,
+                help='Keep running, culling the hosts every given number '
+                     'of seconds')
+def cull_hosts(delete, batch_size, pause, interval):
+    """Archive or delete the hosts not updated within the retention period"""
+    directory = metrics_directory()
+    if not directory:
+        print("prometheus_multiproc_dir is not set, the culling metrics are "
+              "not exported")
+
+    try:
+        while True:
+            culled = culling.cull_hosts(app.config["INVENTORY_CONFIG"],
+                                        not delete, batch_size, pause)
+            print("Culled %d hosts" % culled)
+
+            if interval is None:
+                break
+            time.sleep(interval)
+    finally:
+        if directory:
+            # Like an exited gunicorn worker, see gunicorn.conf.py
+            multiprocess.mark_process_dead(os.getpid(), directory)
+
+
+@manager.option('-o', '--once', dest='once', action='store_true',
+                default=False,
+                help='Run the queued jobs and exit instead of waiting for '
+                     'new ones')
+@manager.option('-p', '--poll-interval', dest='poll_interval', type=float,
+                default=1,
+                help='Seconds to wait before checking for new jobs')
+def run_jobs(once, poll_interval):
+    """Run the asynchronous bulk operation jobs"""
+    config = app.config["INVENTORY_CONFIG"]
+    run = jobs.run_jobs(JOB_HANDLERS, config.job_chunk_size,
+                        config.job_chunk_pause, poll_interval, once,
+                        config.job_lease_time)
+    print("Ran %d jobs" % run)
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,43 @@
+"""Add the host archive and the account modification time index
+
+Revision ID: 4a8e5d1c9b7f
+Revises: 2d951983fa89
+Create Date: 2018-11-20 10:12:43.512398
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '4a8e5d1c9b7f'
+down_revision = '2d951983fa89'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'hosts_archive',
+        sa.Column('id', postgresql.UUID(), nullable=False),
+        sa.Column('account', sa.String(length=10), nullable=True),
+        sa.Column('display_name', sa.String(length=200), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('modified_on', sa.DateTime(), nullable=True),
+        sa.Column('archived_on', sa.DateTime(), nullable=True),
+        sa.Column('tags', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column(
+            'canonical_facts', postgresql.JSONB(astext_type=sa.Text()), nullable=True
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'hosts_account_modified_on_id_idx',
+        'hosts',
+        ['account', 'modified_on', 'id'],
+    )
+
+
+def downgrade():
+    op.drop_index('hosts_account_modified_on_id_idx', table_name='hosts')
+    op.drop_table('hosts_archive')
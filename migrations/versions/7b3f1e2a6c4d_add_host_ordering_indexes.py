@@ -0,0 +1,33 @@
+"""Add the indexes backing the host list ordering
+
+Revision ID: 7b3f1e2a6c4d
+Revises: 4a8e5d1c9b7f
+Create Date: 2018-11-22 14:31:05.207614
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3f1e2a6c4d'
+down_revision = '4a8e5d1c9b7f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'hosts_account_display_name_id_idx',
+        'hosts',
+        ['account', 'display_name', 'id'],
+    )
+    op.create_index(
+        'hosts_account_created_on_id_idx',
+        'hosts',
+        ['account', 'created_on', 'id'],
+    )
+
+
+def downgrade():
+    op.drop_index('hosts_account_created_on_id_idx', table_name='hosts')
+    op.drop_index('hosts_account_display_name_id_idx', table_name='hosts')
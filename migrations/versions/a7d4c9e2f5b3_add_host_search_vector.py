@@ -0,0 +1,58 @@
+"""Add the full-text search of the hosts
+
+Revision ID: a7d4c9e2f5b3
+Revises: f3a8c6d2b4e1
+Create Date: 2018-12-05 09:41:27.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4c9e2f5b3'
+down_revision = 'f3a8c6d2b4e1'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}display_name, '')), 'A')
+    || setweight(jsonb_to_tsvector(
+        'simple', coalesce({row}canonical_facts, '{{}}'), '["string", "numeric"]'
+    ), 'A')
+    || setweight(jsonb_to_tsvector(
+        'simple', coalesce({row}facts, '{{}}'), '["string", "numeric"]'
+    ), 'B')
+"""
+
+
+def upgrade():
+    op.add_column('hosts', sa.Column('search_vector', postgresql.TSVECTOR()))
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION hosts_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER hosts_search_vector
+            BEFORE INSERT OR UPDATE OF display_name, canonical_facts, facts ON hosts
+            FOR EACH ROW EXECUTE FUNCTION hosts_search_vector()
+    """)
+    op.execute(f"UPDATE hosts SET search_vector = {SEARCH_VECTOR_SQL.format(row='')}")
+    op.create_index(
+        'hosts_search_vector_idx',
+        'hosts',
+        ['search_vector'],
+        postgresql_using='gin',
+    )
+
+
+def downgrade():
+    op.drop_index('hosts_search_vector_idx', table_name='hosts')
+    op.execute("DROP TRIGGER hosts_search_vector ON hosts")
+    op.execute("DROP FUNCTION hosts_search_vector()")
+    op.drop_column('hosts', 'search_vector')
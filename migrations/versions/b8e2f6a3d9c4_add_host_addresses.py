@@ -0,0 +1,120 @@
+"""Add the host addresses maintained by triggers
+
+Revision ID: b8e2f6a3d9c4
+Revises: a7d4c9e2f5b3
+Create Date: 2018-12-06 14:02:51.264817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f6a3d9c4'
+down_revision = 'a7d4c9e2f5b3'
+branch_labels = None
+depends_on = None
+
+# The address tables by the canonical fact, with the address type
+ADDRESS_TABLES = {
+    'ip_addresses': ('host_ip_addresses', postgresql.INET, 'inet'),
+    'mac_addresses': ('host_mac_addresses', postgresql.MACADDR, 'macaddr'),
+}
+
+TRIGGER_HOSTS = {
+    'INSERT': 'SELECT id, account, canonical_facts FROM new_rows',
+    'UPDATE': (
+        'SELECT n.id, n.account, n.canonical_facts '
+        'FROM new_rows n JOIN old_rows o ON o.id = n.id '
+        'WHERE n.canonical_facts IS DISTINCT FROM o.canonical_facts '
+        'OR n.account IS DISTINCT FROM o.account'
+    ),
+}
+
+
+def _insert_addresses_sql(fact, table, type_name, changed_hosts):
+    return f"""
+        INSERT INTO {table} (host_id, account, address)
+        SELECT DISTINCT h.id, h.account, a.address
+        FROM ({changed_hosts}) h CROSS JOIN LATERAL (
+            SELECT hosts_to_{type_name}(value) AS address
+            FROM jsonb_array_elements_text(
+                CASE jsonb_typeof(h.canonical_facts -> '{fact}')
+                WHEN 'array' THEN h.canonical_facts -> '{fact}'
+                ELSE '[]' END
+            )
+        ) a
+        WHERE h.account IS NOT NULL AND a.address IS NOT NULL
+    """
+
+
+def upgrade():
+    for fact, (table, address_type, type_name) in ADDRESS_TABLES.items():
+        op.create_table(
+            table,
+            sa.Column('host_id', postgresql.UUID(), nullable=False),
+            sa.Column('address', address_type(), nullable=False),
+            sa.Column('account', sa.String(length=10), nullable=False),
+            sa.ForeignKeyConstraint(['host_id'], ['hosts.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('host_id', 'address'),
+        )
+        op.create_index(f'{table}_account_address_idx', table, ['account', 'address'])
+
+        op.execute(f"""
+            CREATE FUNCTION hosts_to_{type_name}(value text) RETURNS {type_name} AS $$
+            BEGIN
+                RETURN value::{type_name};
+            EXCEPTION WHEN invalid_text_representation THEN
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql IMMUTABLE STRICT
+        """)
+
+    for operation, changed_hosts in TRIGGER_HOSTS.items():
+        statements = []
+        for fact, (table, _, type_name) in ADDRESS_TABLES.items():
+            if operation == 'UPDATE':
+                statements.append(
+                    f'DELETE FROM {table} WHERE host_id IN '
+                    f'(SELECT id FROM ({changed_hosts}) changed_hosts);'
+                )
+            statements.append(
+                _insert_addresses_sql(fact, table, type_name, changed_hosts) + ';'
+            )
+
+        referencing = 'NEW TABLE AS new_rows'
+        if operation == 'UPDATE':
+            referencing = 'OLD TABLE AS old_rows ' + referencing
+        name = f'hosts_addresses_{operation.lower()}'
+        body = '\n'.join(statements)
+        op.execute(f"""
+            CREATE FUNCTION {name}() RETURNS trigger AS $$
+            BEGIN
+                {body}
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {name}
+                AFTER {operation} ON hosts
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {name}()
+        """)
+
+    for fact, (table, _, type_name) in ADDRESS_TABLES.items():
+        op.execute(_insert_addresses_sql(
+            fact, table, type_name, 'SELECT id, account, canonical_facts FROM hosts'
+        ))
+
+
+def downgrade():
+    for operation in TRIGGER_HOSTS:
+        name = f'hosts_addresses_{operation.lower()}'
+        op.execute(f'DROP TRIGGER {name} ON hosts')
+        op.execute(f'DROP FUNCTION {name}()')
+    for table, _, type_name in ADDRESS_TABLES.values():
+        op.drop_index(f'{table}_account_address_idx', table_name=table)
+        op.drop_table(table)
+        op.execute(f'DROP FUNCTION hosts_to_{type_name}(text)')
@@ -0,0 +1,91 @@
+"""Add the host tag counts maintained by triggers
+
+Revision ID: c2e8a4f0b915
+Revises: 7b3f1e2a6c4d
+Create Date: 2018-11-27 09:48:16.730152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e8a4f0b915'
+down_revision = '7b3f1e2a6c4d'
+branch_labels = None
+depends_on = None
+
+TRIGGER_ROWS = {
+    'INSERT': (('NEW', 1),),
+    'UPDATE': (('NEW', 1), ('OLD', -1)),
+    'DELETE': (('OLD', -1),),
+}
+
+
+def upgrade():
+    op.create_table(
+        'host_tag_counts',
+        sa.Column('account', sa.String(length=10), nullable=False),
+        sa.Column('tag', sa.Text(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('account', 'tag'),
+    )
+    op.create_index(
+        'host_tag_counts_unused_idx',
+        'host_tag_counts',
+        ['account'],
+        postgresql_where=sa.text('count <= 0'),
+    )
+
+    for operation, transition_tables in TRIGGER_ROWS.items():
+        changed_tags = ' UNION ALL '.join(
+            f"SELECT DISTINCT h.id, h.account, t.tag, {sign} AS delta "
+            f"FROM {rows.lower()}_rows h, "
+            "jsonb_array_elements_text(coalesce(h.tags, '[]')) t(tag) "
+            "WHERE h.account IS NOT NULL"
+            for rows, sign in transition_tables
+        )
+        referencing = ' '.join(
+            f'{rows} TABLE AS {rows.lower()}_rows' for rows, _ in transition_tables
+        )
+        name = f'hosts_tag_counts_{operation.lower()}'
+        op.execute(f"""
+            CREATE FUNCTION {name}() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO host_tag_counts (account, tag, count)
+                SELECT account, tag, sum(delta)
+                FROM ({changed_tags}) changed_tags
+                GROUP BY account, tag
+                HAVING sum(delta) <> 0
+                ORDER BY account, tag
+                ON CONFLICT (account, tag)
+                DO UPDATE SET count = host_tag_counts.count + excluded.count;
+
+                DELETE FROM host_tag_counts WHERE count <= 0;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {name}
+                AFTER {operation} ON hosts
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION {name}()
+        """)
+
+    op.execute("""
+        INSERT INTO host_tag_counts (account, tag, count)
+        SELECT h.account, t.tag, count(DISTINCT h.id)
+        FROM hosts h, jsonb_array_elements_text(coalesce(h.tags, '[]')) t(tag)
+        WHERE h.account IS NOT NULL
+        GROUP BY h.account, t.tag
+    """)
+
+
+def downgrade():
+    for operation in TRIGGER_ROWS:
+        name = f'hosts_tag_counts_{operation.lower()}'
+        op.execute(f'DROP TRIGGER {name} ON hosts')
+        op.execute(f'DROP FUNCTION {name}()')
+    op.drop_index('host_tag_counts_unused_idx', table_name='host_tag_counts')
+    op.drop_table('host_tag_counts')
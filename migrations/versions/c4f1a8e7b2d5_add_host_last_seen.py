@@ -0,0 +1,34 @@
+"""Add the last check-in time of the hosts
+
+Revision ID: c4f1a8e7b2d5
+Revises: b8e2f6a3d9c4
+Create Date: 2018-12-10 11:17:36.482910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f1a8e7b2d5'
+down_revision = 'b8e2f6a3d9c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('hosts', sa.Column('last_seen', sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE hosts SET last_seen = coalesce(modified_on, timezone('utc', now()))"
+    )
+    op.alter_column(
+        'hosts', 'last_seen', server_default=sa.text("timezone('utc', now())")
+    )
+    op.create_index(
+        'hosts_account_last_seen_id_idx', 'hosts', ['account', 'last_seen', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('hosts_account_last_seen_id_idx', table_name='hosts')
+    op.drop_column('hosts', 'last_seen')
@@ -0,0 +1,38 @@
+"""Add the lease of the running jobs
+
+Revision ID: d6b3e9a4c7f2
+Revises: c4f1a8e7b2d5
+Create Date: 2018-12-11 09:42:18.215634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6b3e9a4c7f2'
+down_revision = 'c4f1a8e7b2d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('jobs', sa.Column('locked_until', sa.DateTime(), nullable=True))
+    op.drop_index('jobs_queued_created_on_idx', table_name='jobs')
+    op.create_index(
+        'jobs_pending_created_on_idx',
+        'jobs',
+        ['created_on'],
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade():
+    op.drop_index('jobs_pending_created_on_idx', table_name='jobs')
+    op.create_index(
+        'jobs_queued_created_on_idx',
+        'jobs',
+        ['created_on'],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.drop_column('jobs', 'locked_until')
@@ -0,0 +1,23 @@
+"""Add the account and host ID index
+
+Revision ID: e5b9d3f7a1c6
+Revises: c2e8a4f0b915
+Create Date: 2018-11-29 10:12:44.318905
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9d3f7a1c6'
+down_revision = 'c2e8a4f0b915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('hosts_account_id_idx', 'hosts', ['account', 'id'])
+
+
+def downgrade():
+    op.drop_index('hosts_account_id_idx', table_name='hosts')
@@ -0,0 +1,45 @@
+"""Add the asynchronous jobs
+
+Revision ID: f3a8c6d2b4e1
+Revises: e5b9d3f7a1c6
+Create Date: 2018-12-03 13:25:09.871254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c6d2b4e1'
+down_revision = 'e5b9d3f7a1c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', postgresql.UUID(), nullable=False),
+        sa.Column('account', sa.String(length=10), nullable=False),
+        sa.Column('operation', sa.String(length=50), nullable=False),
+        sa.Column('parameters', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('started_on', sa.DateTime(), nullable=True),
+        sa.Column('finished_on', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'jobs_queued_created_on_idx',
+        'jobs',
+        ['created_on'],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade():
+    op.drop_index('jobs_queued_created_on_idx', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+
+import os
+
+from aiohttp import web
+
+from app.async_app import create_async_app
+
+config_name = os.getenv('APP_SETTINGS', "development")
+application = create_async_app(config_name)
+listen_port = os.getenv('LISTEN_PORT', 8080)
+
+if __name__ == '__main__':
+    web.run_app(application, host="0.0.0.0", port=int(listen_port))
@@ -1,22 +1,42 @@
 #!/usr/bin/env python
 
+import asyncio
 import unittest
 import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest.mock
 import dateutil.parser
 import uuid
 import copy
+from aiohttp.test_utils import TestClient, TestServer
+from api import metrics
+from api.jobs import HANDLERS as JOB_HANDLERS
 from app import create_app, db
+from app.async_app import create_async_app
 from app.auth import current_identity
 from app.auth.identity import Identity
+from app.culling import cull_hosts
+from app.host_deletion import delete_hosts
+from app.host_facts import update_facts
+from app.host_import import import_hosts
+from app.host_tags import update_tags
+from app.jobs import run_next_job
+from app.models import Host, HostArchive, HostIpAddress, HostMacAddress, HostTagCount, Job
 from app.utils import HostWrapper
 from base64 import b64encode
 from json import dumps
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urlsplit, urlencode, parse_qs, urlunsplit
 
 HOST_URL = "/r/insights/platform/inventory/api/v1/hosts"
+TAG_URL = "/r/insights/platform/inventory/api/v1/tags"
+JOB_URL = "/r/insights/platform/inventory/api/v1/jobs"
 HEALTH_URL = "/health"
 METRICS_URL = "/metrics"
+PROFILES_URL = "/profiles"
 
 NS = "testns"
 ID = "whoabuddy"
@@ -71,6 +91,13 @@ class BaseAPITestCase(unittest.TestCase):
             return_response_as_json,
         )
 
+    def delete(self, path, status=200, return_response_as_json=True):
+        return self._response_check(
+            self.client().delete(path, headers=self._get_valid_auth_header()),
+            status,
+            return_response_as_json,
+        )
+
     def post(self, path, data, status=200, return_response_as_json=True):
         return self._make_http_call(
             self.client().post, path, data, status, return_response_as_json
@@ -112,15 +139,19 @@ class DBAPITestCase(BaseAPITestCase):
     @classmethod
     def setUpClass(cls):
         """
-        Temporarily rename the host table while the tests run.  This is done
-        to make dropping the table at the end of the tests a bit safer.
+        Temporarily rename the tables and their indexes while the tests run.
+        This is done to make dropping the tables at the end of the tests a bit
+        safer.
         """
-        from app.models import Host
         temp_table_name_suffix = "__unit_tests__"
-        if temp_table_name_suffix not in Host.__table__.name:
-            Host.__table__.name = Host.__table__.name + temp_table_name_suffix
-        if temp_table_name_suffix not in Host.__table__.fullname:
-            Host.__table__.fullname = Host.__table__.fullname + temp_table_name_suffix
+        for table in db.metadata.tables.values():
+            if temp_table_name_suffix not in table.name:
+                table.name = table.name + temp_table_name_suffix
+            if temp_table_name_suffix not in table.fullname:
+                table.fullname = table.fullname + temp_table_name_suffix
+            for index in table.indexes:
+                if temp_table_name_suffix not in index.name:
+                    index.name = index.name + temp_table_name_suffix
 
     def setUp(self):
         """
@@ -149,6 +180,28 @@ class DBAPITestCase(BaseAPITestCase):
 
 
 class CreateHostsTestCase(DBAPITestCase):
+    def test_update_without_changes(self):
+        facts = [{"namespace": "ns1", "facts": {"key1": "value1"}}]
+        host_data = test_data(display_name="unchanged", facts=facts)
+
+        created_host = self.post(HOST_URL, host_data, 201)
+
+        # Re-checking in with the same data does not write the host
+        unchanged_host = self.post(HOST_URL, host_data, 200)
+        self.assertEqual(unchanged_host, created_host)
+
+        # Without a display name and with the facts of one of the namespaces,
+        # the data is the same too
+        host_data["display_name"] = None
+        host_data["facts"] = []
+        unchanged_host = self.post(HOST_URL, host_data, 200)
+        self.assertEqual(unchanged_host, created_host)
+
+        host_data["facts"] = [{"namespace": "ns1", "facts": {"key1": "value2"}}]
+        updated_host = self.post(HOST_URL, host_data, 200)
+        self.assertEqual(updated_host["facts"], host_data["facts"])
+        self.assertNotEqual(updated_host["updated"], created_host["updated"])
+
     def test_create_and_update(self):
         facts = None
         tags = ["/merge_me_1:value1"]
@@ -307,6 +360,60 @@ class CreateHostsTestCase(DBAPITestCase):
         assert "type" in response_data
 
 
+class DedupCacheTestCase(DBAPITestCase):
+    """
+    Tests the host deduplication cache.
+    """
+
+    def _lookup_count(self, result):
+        return metrics.dedup_cache_lookup_count.labels(result)._value.get()
+
+    def _cached_host_id(self, name, value):
+        cache = self.app.config["DEDUP_CACHE"]
+        key = f"dedup:{ACCOUNT}:{name}:{json.dumps(value)}"
+        return cache.backend.get_many([key])[0]
+
+    def _post_host(self, status, **canonical_facts):
+        return self.post(HOST_URL, {**test_data(), **canonical_facts}, status)
+
+    def test_check_in_is_cache_hit(self):
+        created_host = self._post_host(201, insights_id="id-1", fqdn="a.example.com")
+        self.assertEqual(self._cached_host_id("fqdn", "a.example.com"), created_host["id"])
+
+        hits = self._lookup_count("hit")
+        updated_host = self._post_host(200, fqdn="a.example.com")
+        self.assertEqual(updated_host["id"], created_host["id"])
+        self.assertEqual(self._lookup_count("hit"), hits + 1)
+
+    def test_stale_entry_falls_back_to_query(self):
+        self._post_host(201, insights_id="id-1")
+        with self.app.app_context():
+            Host.query.delete()
+            db.session.commit()
+
+        stale = self._lookup_count("stale")
+        self._post_host(201, insights_id="id-1")
+        self.assertEqual(self._lookup_count("stale"), stale + 1)
+
+    def test_deleted_host_is_forgotten(self):
+        created_host = self._post_host(201, insights_id="id-1")
+        self.delete(HOST_URL + "/" + created_host["id"], 200)
+        self.assertIsNone(self._cached_host_id("insights_id", "id-1"))
+
+        created_host = self._post_host(201, insights_id="id-2", display_name="deleted")
+        self.delete(inject_qs(HOST_URL, display_name="deleted"), 200)
+        self.assertIsNone(self._cached_host_id("insights_id", "id-2"))
+
+    def test_changed_canonical_fact_is_forgotten(self):
+        ip_addresses = ["10.0.0.1", "10.0.0.2"]
+        created_host = self._post_host(201, insights_id="id-1", ip_addresses=ip_addresses[:1])
+        self._post_host(200, insights_id="id-1", ip_addresses=ip_addresses, fqdn="a.example.com")
+
+        self.assertIsNone(self._cached_host_id("ip_addresses", ip_addresses[:1]))
+        for name, value in (("ip_addresses", ip_addresses), ("fqdn", "a.example.com")):
+            self.assertEqual(self._cached_host_id(name, value), created_host["id"])
+
+
 class PreCreatedHostsBaseTestCase(DBAPITestCase):
     def setUp(self):
         super(PreCreatedHostsBaseTestCase, self).setUp()
@@ -427,6 +534,721 @@ class QueryTestCase(PreCreatedHostsBaseTestCase):
 
         self._base_paging_test(test_url)
 
+    def _query_ordered_names(self, url, **order):
+        response = self.get(inject_qs(url, **order), 200)
+        return [host["display_name"] for host in response["results"]]
+
+    def test_query_ordered(self):
+        # The hosts were created and updated in the order host1, host2
+        expected_orders = [
+            ({}, ["host2", "host1"]),
+            ({"order_by": "display_name"}, ["host1", "host2"]),
+            ({"order_by": "display_name", "order_how": "DESC"}, ["host2", "host1"]),
+            ({"order_by": "updated", "order_how": "ASC"}, ["host1", "host2"]),
+            ({"order_by": "created"}, ["host2", "host1"]),
+            ({"order_by": "created", "order_how": "ASC"}, ["host1", "host2"]),
+        ]
+        host_id_list = self._build_host_id_list_for_url(self.added_hosts)
+
+        for url in (HOST_URL, HOST_URL + "/" + host_id_list):
+            for order, expected_names in expected_orders:
+                with self.subTest(url=url, order=order):
+                    self.assertListEqual(
+                        self._query_ordered_names(url, **order), expected_names
+                    )
+
+    def test_query_ordered_pages(self):
+        names = [
+            self._query_ordered_names(
+                HOST_URL, order_by="display_name", page=str(page), per_page="1"
+            )
+            for page in (1, 2)
+        ]
+        self.assertListEqual(names, [["host1"], ["host2"]])
+
+    def test_query_with_invalid_ordering(self):
+        self.get(inject_qs(HOST_URL, order_by="account"), 400)
+        self.get(inject_qs(HOST_URL, order_how="UP"), 400)
+
+    def _search_names(self, q, **order):
+        return self._query_ordered_names(HOST_URL, q=q, **order)
+
+    def test_query_using_search(self):
+        expected_names = [
+            ("host1", ["host1"]),
+            ("54321", ["host2"]),
+            ("value1", ["host1", "host2"]),
+            ("value1 -host2", ["host1"]),
+            ('"value1" or "host2"', ["host1", "host2"]),
+            ("key1", []),
+            ("value", []),
+        ]
+        for q, names in expected_names:
+            with self.subTest(q=q):
+                self.assertCountEqual(self._search_names(q), names)
+
+        self.get(inject_qs(HOST_URL, q=""), 400)
+
+    def test_search_follows_host_changes(self):
+        host_id = self.added_hosts[0].id
+        self.patch(f"{HOST_URL}/{host_id}/facts/ns1", {"key2": "newvalue"}, 200)
+        self.assertEqual(self._search_names("newvalue"), ["host1"])
+
+        # Only the changes of the searched columns compute the document again
+        with self.app.app_context():
+            Host.query.update(
+                {Host.search_vector: db.func.to_tsvector("simple", "stale")},
+                synchronize_session=False,
+            )
+            Host.query.update(
+                {Host.last_seen: datetime.utcnow(), Host.tags: ["ns/tag"]},
+                synchronize_session=False,
+            )
+            db.session.commit()
+        self.assertCountEqual(self._search_names("stale"), ["host1", "host2"])
+
+        self.patch(f"{HOST_URL}/{host_id}/facts/ns1", {"key3": "othervalue"}, 200)
+        self.assertEqual(self._search_names("othervalue"), ["host1"])
+        self.assertEqual(self._search_names("stale"), ["host2"])
+
+    def test_query_using_search_ranked(self):
+        # The display name is ranked above the facts
+        self.assertListEqual(self._search_names("host1 or value1"), ["host1", "host2"])
+        self.assertListEqual(
+            self._search_names("host1 or value1", order_how="ASC"), ["host2", "host1"]
+        )
+        self.assertListEqual(
+            self._search_names("host1 or value1", order_by="updated"), ["host2", "host1"]
+        )
+
+    def test_query_using_search_of_changed_facts(self):
+        url = HOST_URL + "/" + str(self.added_hosts[0].id) + "/facts/ns1"
+        self.patch(url, {"serial": "ABC123"}, 200)
+
+        self.assertListEqual(self._search_names("abc123"), ["host1"])
+
+
+class AddressQueryTestCase(DBAPITestCase):
+    def setUp(self):
+        super(AddressQueryTestCase, self).setUp()
+        self.added_hosts = {}
+        for display_name, ip_addresses, mac_addresses in (
+            ("host1", ["10.12.0.1", "192.168.0.1"], ["c2:00:d0:c8:61:01"]),
+            ("host2", ["10.12.200.1", "fe80::1"], ["c2:00:d0:c8:61:02"]),
+            ("host3", ["10.13.0.1", "not-an-ip"], ["not-a-mac"]),
+        ):
+            host_data = {
+                **test_data(display_name),
+                "insights_id": display_name,
+                "ip_addresses": ip_addresses,
+                "mac_addresses": mac_addresses,
+            }
+            self.added_hosts[display_name] = self.post(HOST_URL, host_data, 201)
+
+    def _query_names(self, **params):
+        response = self.get(inject_qs(HOST_URL, **params), 200)
+        return sorted(host["display_name"] for host in response["results"])
+
+    def test_query_using_ip_address(self):
+        expected_names = [
+            ("10.12.0.1", ["host1"]),
+            ("10.12.0.0/16", ["host1", "host2"]),
+            ("10.12.0.0/8", ["host1", "host2", "host3"]),
+            ("192.168.0.0/24", ["host1"]),
+            ("fe80::/64", ["host2"]),
+            ("172.16.0.0/12", []),
+        ]
+        for ip_address, names in expected_names:
+            with self.subTest(ip_address=ip_address):
+                self.assertListEqual(self._query_names(ip_address=ip_address), names)
+
+        self.assertListEqual(
+            self._query_names(ip_address="10.12.0.0/16", display_name="host2"), ["host2"]
+        )
+
+    def test_query_using_mac_address(self):
+        for mac_address in ("c2:00:d0:c8:61:01", "C2-00-D0-C8-61-01", "c200.d0c8.6101"):
+            with self.subTest(mac_address=mac_address):
+                self.assertListEqual(self._query_names(mac_address=mac_address), ["host1"])
+
+        self.assertListEqual(self._query_names(mac_address="c2:00:d0:c8:61:ff"), [])
+
+    def test_query_using_invalid_address(self):
+        self.get(inject_qs(HOST_URL, ip_address="10.12.0.0/33"), 400)
+        self.get(inject_qs(HOST_URL, ip_address="host1"), 400)
+        self.get(inject_qs(HOST_URL, mac_address="c2:00:d0:c8:61"), 400)
+
+    def test_addresses_follow_host_changes(self):
+        host_data = {
+            **test_data("host1"),
+            "insights_id": "host1",
+            "ip_addresses": ["10.12.0.1", "192.168.0.1", "10.14.0.1"],
+            "mac_addresses": ["c2:00:d0:c8:61:01", "c2:00:d0:c8:61:03"],
+        }
+        self.post(HOST_URL, host_data, 200)
+
+        self.assertListEqual(self._query_names(ip_address="10.14.0.1"), ["host1"])
+        self.assertListEqual(self._query_names(mac_address="c2:00:d0:c8:61:03"), ["host1"])
+
+        with self.app.app_context():
+            Host.query.filter(Host.display_name == "host2").update(
+                {Host.canonical_facts: {"insights_id": "host2", "ip_addresses": ["10.15.0.1"]}},
+                synchronize_session=False,
+            )
+            db.session.commit()
+
+        self.assertListEqual(self._query_names(ip_address="10.15.0.1"), ["host2"])
+        self.assertListEqual(self._query_names(ip_address="10.12.200.1"), [])
+        self.assertListEqual(self._query_names(mac_address="c2:00:d0:c8:61:02"), [])
+
+        self.delete(HOST_URL + "/" + self.added_hosts["host1"]["id"], 200)
+        with self.app.app_context():
+            for model in (HostIpAddress, HostMacAddress):
+                host_ids = {str(host_id) for host_id, in db.session.query(model.host_id)}
+                self.assertNotIn(self.added_hosts["host1"]["id"], host_ids)
+
+    def test_query_addresses_of_account(self):
+        with self.app.app_context():
+            db.session.add(
+                Host({"ip_addresses": ["10.12.0.2"]}, "other", "000000", [])
+            )
+            db.session.commit()
+
+        self.assertListEqual(self._query_names(ip_address="10.12.0.2"), [])
+
+
+class HostChangesTestCase(PreCreatedHostsBaseTestCase):
+    def setUp(self):
+        super(HostChangesTestCase, self).setUp()
+        # The hosts were just created
+        self.app.config["INVENTORY_CONFIG"].changes_settle_time = 0
+
+    def _changes(self, status=200, **params):
+        return self.get(inject_qs(HOST_URL + "/changes", **params), status)
+
+    def test_follow_changes(self):
+        response = self._changes(limit="1")
+        self.assertEqual(response["count"], 1)
+        self.assertEqual(response["results"][0]["display_name"], "host1")
+
+        response = self._changes(limit="1", cursor=response["cursor"])
+        self.assertEqual(response["results"][0]["display_name"], "host2")
+
+        cursor = response["cursor"]
+        response = self._changes(cursor=cursor)
+        self.assertEqual(response, {"count": 0, "cursor": cursor, "results": []})
+
+        # Updating the host moves it to the end of the feed
+        facts_url = HOST_URL + "/" + self.added_hosts[0].id + "/facts/ns1"
+        self.patch(facts_url, {"key2": "value2"}, 200)
+
+        response = self._changes(cursor=cursor)
+        self.assertEqual(
+            [host["display_name"] for host in response["results"]], ["host1"]
+        )
+        self.assertNotEqual(response["cursor"], cursor)
+
+    def test_changes_since_timestamp(self):
+        updated = self.get(HOST_URL + "/" + self.added_hosts[0].id, 200)["results"][0][
+            "updated"
+        ]
+
+        response = self._changes(updated_since=updated)
+        self.assertEqual(
+            [host["display_name"] for host in response["results"]], ["host2"]
+        )
+
+        response = self._changes(updated_since=datetime.now(timezone.utc).isoformat())
+        self.assertEqual(response, {"count": 0, "cursor": None, "results": []})
+
+    def test_unsettled_changes_are_not_reported(self):
+        self.app.config["INVENTORY_CONFIG"].changes_settle_time = 3600
+        self.assertEqual(self._changes(), {"count": 0, "cursor": None, "results": []})
+
+    def test_changes_with_invalid_cursor(self):
+        for cursor in ("invalid", "eyJ1cGRhdGVkIjogMX0="):
+            with self.subTest(cursor=cursor):
+                self._changes(400, cursor=cursor)
+
+    def test_query_updated_since(self):
+        response = self.get(
+            inject_qs(HOST_URL, updated_since="2000-01-01T00:00:00Z"), 200
+        )
+        self.assertEqual(response["total"], 2)
+
+        response = self.get(
+            inject_qs(HOST_URL, updated_since=datetime.now(timezone.utc).isoformat()),
+            200,
+        )
+        self.assertEqual(response["total"], 0)
+
+        self.get(inject_qs(HOST_URL, updated_since="yesterday"), 400)
+
+
+class LookupHostsTestCase(PreCreatedHostsBaseTestCase):
+    def _lookup(self, host_id_list, status=200):
+        return self.post(HOST_URL + "/lookup", {"ids": host_id_list}, status)
+
+    def _lookup_test(self):
+        missing_id = str(uuid.uuid4())
+        host_id_list = [host.id for host in self.added_hosts]
+
+        response = self._lookup(host_id_list + [missing_id, host_id_list[0]])
+
+        expected_hosts = self.get(
+            HOST_URL + "/" + self._build_host_id_list_for_url(self.added_hosts), 200
+        )["results"]
+        self.assertEqual(response["count"], 2)
+        self.assertCountEqual(response["results"], expected_hosts)
+        self.assertEqual(response["missing"], [missing_id])
+
+    def test_lookup(self):
+        self._lookup_test()
+
+    def test_lookup_using_temp_table(self):
+        self.app.config["INVENTORY_CONFIG"].lookup_temp_table_threshold = 1
+        self._lookup_test()
+
+    def test_lookup_nothing_found(self):
+        missing_id = str(uuid.uuid4())
+        response = self._lookup([missing_id])
+        self.assertEqual(
+            response, {"results": [], "count": 0, "missing": [missing_id]}
+        )
+
+    def test_lookup_with_invalid_ids(self):
+        self._lookup([], 400)
+        self._lookup(["notauuid"], 400)
+
+    def test_lookup_time_covers_the_stream(self):
+        host_id_list = [host.id for host in self.added_hosts]
+
+        with self.app.test_client() as client, unittest.mock.patch.object(
+            metrics.api_request_time, "observe"
+        ) as observe:
+            response = client.post(
+                HOST_URL + "/lookup",
+                data=json.dumps({"ids": host_id_list}),
+                headers={**self._get_valid_auth_header(), "content-type": "application/json"},
+                buffered=False,
+            )
+            observe.assert_not_called()
+            self.assertEqual(json.loads(response.get_data())["count"], 2)
+            observe.assert_called_once()
+
+    def test_lookup_streams_bytes(self):
+        response = self.client().post(
+            HOST_URL + "/lookup",
+            json={"ids": [host.id for host in self.added_hosts]},
+            headers=self._get_valid_auth_header(),
+            buffered=False,
+        )
+        # The chunks are written by the WSGI server as is
+        chunks = list(response.response)
+        response.close()
+        self.assertTrue(all(isinstance(chunk, bytes) for chunk in chunks))
+        self.assertEqual(json.loads(b"".join(chunks))["count"], 2)
+
+
+class AsyncQueryTestCase(PreCreatedHostsBaseTestCase):
+    """
+    Tests the read operations served by the asynchronous application return
+    the same responses as the Flask ones.
+    """
+
+    def _async_get(self, paths, headers=None):
+        if headers is None:
+            headers = {
+                key: value.decode()
+                for key, value in self._get_valid_auth_header().items()
+            }
+
+        async def _get_all():
+            async with TestClient(TestServer(create_async_app("testing"))) as client:
+                responses = []
+                for path in paths:
+                    response = await client.get(path, headers=headers)
+                    responses.append((response.status, await response.json()))
+                return responses
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(_get_all())
+        finally:
+            loop.close()
+
+    def test_same_responses_as_sync_api(self):
+        host_id_list = self._build_host_id_list_for_url(self.added_hosts)
+        paths = [
+            HOST_URL,
+            inject_qs(HOST_URL, page="2", per_page="1"),
+            inject_qs(HOST_URL, display_name=self.added_hosts[0].display_name),
+            inject_qs(HOST_URL, tag=TAGS[0]),
+            inject_qs(HOST_URL, order_by="display_name", order_how="DESC"),
+            inject_qs(HOST_URL, updated_since="2000-01-01T00:00:00Z"),
+            inject_qs(HOST_URL, q="host1 or value1"),
+            inject_qs(HOST_URL, ip_address="10.0.0.0/8"),
+            inject_qs(HOST_URL, mac_address="C2-00-D0-C8-61-01"),
+            f"{HOST_URL}/{host_id_list}",
+            inject_qs(f"{HOST_URL}/{host_id_list}", page="2", per_page="1"),
+        ]
+
+        for path, (status, response) in zip(paths, self._async_get(paths)):
+            with self.subTest(path=path):
+                self.assertEqual(status, 200)
+                self.assertEqual(response, self.get(path, 200))
+
+    def test_errors(self):
+        paths = [
+            inject_qs(HOST_URL, page="3", per_page="1"),
+            HOST_URL + "?per_page=0",
+            inject_qs(HOST_URL, updated_since="yesterday"),
+        ]
+        statuses = [status for status, _ in self._async_get(paths)]
+        self.assertListEqual(statuses, [404, 400, 400])
+
+        statuses = [
+            status for status, _ in self._async_get([HOST_URL], {"x-rh-identity": ""})
+        ]
+        self.assertListEqual(statuses, [403])
+
+
+class DeleteHostsTestCase(PreCreatedHostsBaseTestCase):
+    def _remaining_host_ids(self):
+        return {host["id"] for host in self.get(HOST_URL, 200)["results"]}
+
+    def test_delete_using_host_id_list(self):
+        url_host_id_list = (
+            self._build_host_id_list_for_url(self.added_hosts[:1])
+            + ","
+            + str(uuid.uuid4())
+        )
+
+        response = self.delete(HOST_URL + "/" + url_host_id_list, 200)
+
+        self.assertEqual(response["deleted"], 1)
+        self.assertEqual(self._remaining_host_ids(), {self.added_hosts[1].id})
+
+    def test_delete_using_display_name(self):
+        response = self.delete(
+            inject_qs(HOST_URL, display_name=self.added_hosts[1].display_name), 200
+        )
+
+        self.assertEqual(response["deleted"], 1)
+        self.assertEqual(self._remaining_host_ids(), {self.added_hosts[0].id})
+
+    def test_delete_using_updated_before(self):
+        response = self.delete(
+            inject_qs(HOST_URL, updated_before="2000-01-01T00:00:00+02:00"), 200
+        )
+        self.assertEqual(response["deleted"], 0)
+
+        response = self.delete(
+            inject_qs(HOST_URL, updated_before=datetime.now(timezone.utc).isoformat()),
+            200,
+        )
+        self.assertEqual(response["deleted"], 2)
+        self.assertEqual(self._remaining_host_ids(), set())
+
+    def test_delete_using_all_filters(self):
+        host_list = self.added_hosts
+        response = self.delete(
+            inject_qs(
+                HOST_URL,
+                display_name=host_list[0].display_name,
+                tag=TAGS[0],
+                updated_before=datetime.now(timezone.utc).isoformat(),
+            ),
+            200,
+        )
+
+        # The tags are not stored by addHost, so none of the hosts matches
+        self.assertEqual(response["deleted"], 0)
+
+    def test_delete_without_filter(self):
+        self.delete(HOST_URL, 400)
+        self.assertEqual(len(self._remaining_host_ids()), 2)
+
+    def test_delete_with_invalid_timestamp(self):
+        self.delete(inject_qs(HOST_URL, updated_before="yesterday"), 400)
+
+    def test_delete_in_chunks(self):
+        with self.app.app_context():
+            deleted = delete_hosts(Host.account == ACCOUNT, chunk_size=1)
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(self._remaining_host_ids(), set())
+
+    def test_delete_with_invalid_chunk_size(self):
+        with self.app.app_context():
+            for chunk_size in (0, -1):
+                with self.subTest(chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        delete_hosts(Host.account == ACCOUNT, chunk_size=chunk_size)
+                    with self.assertRaises(ValueError):
+                        update_tags("apply", TAGS, Host.account == ACCOUNT, chunk_size)
+                    with self.assertRaises(ValueError):
+                        update_facts(
+                            "merge", "ns1", {"k": "v"}, Host.account == ACCOUNT, chunk_size
+                        )
+
+        self.assertEqual(len(self._remaining_host_ids()), 2)
+
+
+class CullHostsTestCase(PreCreatedHostsBaseTestCase):
+    def setUp(self):
+        super(CullHostsTestCase, self).setUp()
+
+        # Make the first host stale
+        with self.app.app_context():
+            stale_host = Host.query.get(self.added_hosts[0].id)
+            stale_host.modified_on = datetime.utcnow() - timedelta(days=100)
+            stale_host.last_seen = stale_host.modified_on
+            db.session.commit()
+
+    def _remaining_host_ids(self):
+        return {host["id"] for host in self.get(HOST_URL, 200)["results"]}
+
+    def _cull(self, archive=True, retention_overrides=None):
+        config = self.app.config["INVENTORY_CONFIG"]
+        config.cull_retention_days = 90
+        config.cull_retention_overrides = retention_overrides or {}
+        with self.app.app_context():
+            return cull_hosts(config, archive=archive, batch_size=1)
+
+    def test_cull_archives_stale_hosts(self):
+        self.assertEqual(self._cull(), 1)
+        self.assertEqual(self._remaining_host_ids(), {self.added_hosts[1].id})
+
+        with self.app.app_context():
+            archived = HostArchive.query.all()
+            self.assertEqual(len(archived), 1)
+            self.assertEqual(str(archived[0].id), self.added_hosts[0].id)
+            self.assertEqual(
+                archived[0].display_name, self.added_hosts[0].display_name
+            )
+            self.assertIsNotNone(archived[0].archived_on)
+
+    def test_cull_deletes_stale_hosts(self):
+        self.assertEqual(self._cull(archive=False), 1)
+        self.assertEqual(self._remaining_host_ids(), {self.added_hosts[1].id})
+
+        with self.app.app_context():
+            self.assertEqual(HostArchive.query.count(), 0)
+
+    def test_unchanged_check_in_keeps_host(self):
+        stale_host = self.added_hosts[0]
+        updated = self.get(HOST_URL + "/" + stale_host.id, 200)["results"][0]["updated"]
+        host_data = {
+            "account": ACCOUNT,
+            "display_name": stale_host.display_name,
+            "insights_id": stale_host.insights_id,
+            "facts": stale_host.facts,
+        }
+        response = self.post(HOST_URL, host_data, 200)
+        self.assertEqual(response["updated"], updated)
+
+        self.assertEqual(self._cull(), 0)
+        self.assertEqual(len(self._remaining_host_ids()), 2)
+
+        # The next unchanged check-in within the interval writes nothing
+        with self.app.app_context():
+            last_seen = Host.query.get(stale_host.id).last_seen
+        self.post(HOST_URL, host_data, 200)
+        with self.app.app_context():
+            self.assertEqual(Host.query.get(stale_host.id).last_seen, last_seen)
+
+    def test_cull_uses_account_retention_override(self):
+        self.assertEqual(self._cull(retention_overrides={ACCOUNT: 365}), 0)
+        self.assertEqual(len(self._remaining_host_ids()), 2)
+
+        self.assertEqual(self._cull(retention_overrides={ACCOUNT: 0}), 2)
+        self.assertEqual(self._remaining_host_ids(), set())
+
+
+class TagsTestCase(PreCreatedHostsBaseTestCase):
+    def _host_tags(self):
+        return {
+            host["display_name"]: host["tags"]
+            for host in self.get(HOST_URL, 200)["results"]
+        }
+
+    def _update_host_tags(self, host_list, operation, tags, status=200):
+        url = HOST_URL + "/" + self._build_host_id_list_for_url(host_list) + "/tags"
+        return self.patch(url, {"operation": operation, "tags": tags}, status)
+
+    def test_apply_and_remove_tags(self):
+        host_list = self.added_hosts[:1]
+
+        response = self._update_host_tags(host_list, "apply", TAGS)
+        self.assertEqual(response["updated"], 1)
+        self.assertEqual(self._host_tags(), {"host1": TAGS, "host2": []})
+
+        # Applying the same tags again changes nothing
+        response = self._update_host_tags(host_list, "apply", TAGS[:1])
+        self.assertEqual(response["updated"], 0)
+
+        response = self._update_host_tags(host_list, "apply", TAGS[1:] + ["ns/new"])
+        self.assertEqual(response["updated"], 1)
+        self.assertCountEqual(self._host_tags()["host1"], TAGS + ["ns/new"])
+
+        response = self._update_host_tags(host_list, "remove", TAGS + ["ns/other"])
+        self.assertEqual(response["updated"], 1)
+        self.assertEqual(self._host_tags(), {"host1": ["ns/new"], "host2": []})
+
+        response = self._update_host_tags(host_list, "remove", TAGS)
+        self.assertEqual(response["updated"], 0)
+
+    def test_apply_duplicate_tags(self):
+        response = self._update_host_tags(self.added_hosts[:1], "apply", TAGS[1:] + TAGS)
+        self.assertEqual(response["updated"], 1)
+        self.assertEqual(self._host_tags(), {"host1": TAGS[1:] + TAGS[:1], "host2": []})
+
+        tag_counts = {
+            tag_count["tag"]: tag_count["count"]
+            for tag_count in self.get(TAG_URL, 200)["results"]
+        }
+        self.assertEqual(tag_counts, {TAGS[0]: 1, TAGS[1]: 1})
+
+    def test_update_tags_using_filter(self):
+        operation = {"operation": "apply", "tags": TAGS[:1]}
+
+        response = self.patch(
+            inject_qs(HOST_URL + "/tags", display_name="host2"), operation, 200
+        )
+        self.assertEqual(response["updated"], 1)
+        self.assertEqual(self._host_tags(), {"host1": [], "host2": TAGS[:1]})
+
+        response = self.patch(HOST_URL + "/tags", operation, 200)
+        self.assertEqual(response["updated"], 1)
+
+        operation = {"operation": "remove", "tags": TAGS[:1]}
+        response = self.patch(
+            inject_qs(HOST_URL + "/tags", tag=TAGS[0], display_name="host1"),
+            operation,
+            200,
+        )
+        self.assertEqual(response["updated"], 1)
+        self.assertEqual(self._host_tags(), {"host1": [], "host2": TAGS[:1]})
+
+    def test_update_tags_in_chunks(self):
+        with self.app.app_context():
+            updated = update_tags("apply", TAGS, Host.account == ACCOUNT, chunk_size=1)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(self._host_tags(), {"host1": TAGS, "host2": TAGS})
+
+    def test_update_tags_with_invalid_operation(self):
+        self._update_host_tags(self.added_hosts, "replace", TAGS, 400)
+        self._update_host_tags(self.added_hosts, "apply", [], 400)
+
+
+class FactCountsTestCase(PreCreatedHostsBaseTestCase):
+    def _fact_counts(self, status=200, **params):
+        return self.get(inject_qs(HOST_URL + "/aggregate", **params), status)
+
+    def _results(self, **params):
+        return self._fact_counts(**params)["results"]
+
+    def test_count_by_fact(self):
+        self.assertEqual(
+            self._results(fact="ns1/key1"), [{"value": "value1", "count": 2}]
+        )
+        self.assertEqual(
+            self._results(fact="ns1/nokey"), [{"value": None, "count": 2}]
+        )
+
+    def test_count_by_canonical_fact(self):
+        self.assertEqual(
+            self._results(canonical_fact="insights_id"),
+            [{"value": "12345", "count": 1}, {"value": "54321", "count": 1}],
+        )
+
+        response = self._fact_counts(
+            canonical_fact="insights_id", page="2", per_page="1"
+        )
+        self.assertEqual(response["total"], 2)
+        self.assertEqual(response["results"], [{"value": "54321", "count": 1}])
+
+        self._fact_counts(404, canonical_fact="insights_id", page="3", per_page="1")
+
+    def test_count_with_filter(self):
+        self.assertEqual(
+            self._results(canonical_fact="insights_id", display_name="host2"),
+            [{"value": "54321", "count": 1}],
+        )
+
+    def test_count_is_cached(self):
+        self._results(fact="ns1/key1")
+
+        with self.app.app_context():
+            Host.query.filter(Host.display_name == "host1").delete()
+            db.session.commit()
+
+        self.assertEqual(
+            self._results(fact="ns1/key1"), [{"value": "value1", "count": 2}]
+        )
+
+        self.app.config["AGGREGATION_CACHE"].clear()
+        self.assertEqual(
+            self._results(fact="ns1/key1"), [{"value": "value1", "count": 1}]
+        )
+
+    def test_count_with_invalid_parameters(self):
+        self._fact_counts(400)
+        self._fact_counts(400, fact="ns1/key1", canonical_fact="insights_id")
+        self._fact_counts(400, canonical_fact="ip_addresses")
+        for fact in ("ns1", "ns1/", "/key1"):
+            with self.subTest(fact=fact):
+                self._fact_counts(400, fact=fact)
+
+
+class TagCatalogTestCase(PreCreatedHostsBaseTestCase):
+    def _tag_counts(self, url=TAG_URL):
+        return {
+            tag_count["tag"]: tag_count["count"]
+            for tag_count in self.get(url, 200)["results"]
+        }
+
+    def _update_tags(self, host_list, operation, tags):
+        url = HOST_URL + "/" + self._build_host_id_list_for_url(host_list) + "/tags"
+        self.patch(url, {"operation": operation, "tags": tags}, 200)
+
+    def test_tag_counts_follow_host_changes(self):
+        self.assertEqual(self._tag_counts(), {})
+
+        self._update_tags(self.added_hosts, "apply", TAGS[:1])
+        self._update_tags(self.added_hosts[:1], "apply", TAGS[1:])
+        self.assertEqual(self._tag_counts(), {TAGS[0]: 2, TAGS[1]: 1})
+
+        self._update_tags(self.added_hosts, "remove", TAGS[1:])
+        self.assertEqual(self._tag_counts(), {TAGS[0]: 2})
+
+        self.delete(HOST_URL + "/" + self.added_hosts[0].id, 200)
+        self.assertEqual(self._tag_counts(), {TAGS[0]: 1})
+
+    def test_tag_counts_paging_and_search(self):
+        self._update_tags(self.added_hosts, "apply", TAGS)
+
+        response = self.get(inject_qs(TAG_URL, page="2", per_page="1"), 200)
+        self.assertEqual(response["total"], 2)
+        self.assertEqual(response["results"], [{"tag": sorted(TAGS)[1], "count": 2}])
+
+        self.assertEqual(
+            self._tag_counts(inject_qs(TAG_URL, search="new_tag")), {TAGS[0]: 2}
+        )
+
+    def test_tag_counts_are_per_account(self):
+        self._update_tags(self.added_hosts, "apply", TAGS)
+
+        with self.app.app_context():
+            HostTagCount.query.filter(HostTagCount.account == ACCOUNT).update(
+                {HostTagCount.account: "000000"}
+            )
+            db.session.commit()
+
+        self.assertEqual(self._tag_counts(), {})
+
 
 class FactsTestCase(PreCreatedHostsBaseTestCase):
     def _valid_fact_doc(self):
@@ -468,6 +1290,36 @@ class FactsTestCase(PreCreatedHostsBaseTestCase):
 
             self.assertEqual(host_to_verify.facts[0]["namespace"], target_namespace)
 
+    def test_get_facts_in_namespace(self):
+        self.patch(self._build_facts_url(self.added_hosts[:1], "ns1"), {"key2": "value2"}, 200)
+
+        response = self.get(self._build_facts_url(self.added_hosts, "ns1"), 200)
+        self.assertEqual(response["total"], 2)
+        self.assertEqual(
+            {result["id"]: result["facts"] for result in response["results"]},
+            {
+                self.added_hosts[0].id: {"key1": "value1", "key2": "value2"},
+                self.added_hosts[1].id: {"key1": "value1"},
+            },
+        )
+
+    def test_get_facts_in_null_namespace(self):
+        with self.app.app_context():
+            Host.query.update({Host.facts: {"ns1": None}}, synchronize_session=False)
+            db.session.commit()
+
+        response = self.get(self._build_facts_url(self.added_hosts, "ns1"), 200)
+        self.assertEqual(response["total"], 2)
+        self.assertEqual([result["facts"] for result in response["results"]], [{}, {}])
+
+    def test_get_facts_in_missing_namespace(self):
+        response = self.get(self._build_facts_url(self.added_hosts, "ns2"), 200)
+        self.assertEqual(response["total"], 0)
+        self.assertEqual(response["results"], [])
+
+    def test_get_facts_paging(self):
+        self._base_paging_test(self._build_facts_url(self.added_hosts, "ns1"))
+
     def test_add_facts_without_fact_dict(self):
         patch_url = self._build_facts_url(1, "ns1")
         response = self.patch(patch_url, None, 400)
@@ -570,6 +1422,312 @@ class FactsTestCase(PreCreatedHostsBaseTestCase):
         self._basic_fact_test(new_facts, expected_facts, True)
 
 
+class JobsTestCase(PreCreatedHostsBaseTestCase):
+    def _submit_job(self, operation, parameters, status=202):
+        return self.post(JOB_URL, {"operation": operation, "parameters": parameters}, status)
+
+    def _run_job(self, handlers=JOB_HANDLERS, chunk_size=1):
+        with self.app.app_context():
+            return run_next_job(handlers, chunk_size)
+
+    def _host_list(self):
+        return {host["display_name"]: host for host in self.get(HOST_URL, 200)["results"]}
+
+    def test_delete_hosts_job(self):
+        response = self.post(
+            JOB_URL,
+            {"operation": "delete_hosts", "parameters": {"filters": {"display_name": "host1"}}},
+            202,
+            return_response_as_json=False,
+        )
+        job = json.loads(response.data)
+        self.assertEqual(job["status"], "queued")
+        self.assertEqual(job["processed"], 0)
+        self.assertTrue(response.headers["Location"].endswith(JOB_URL + "/" + job["id"]))
+
+        self.assertEqual(self._run_job().id, uuid.UUID(job["id"]))
+        self.assertIsNone(self._run_job())
+
+        job = self.get(JOB_URL + "/" + job["id"], 200)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["processed"], 1)
+        self.assertEqual(job["result"], {"deleted": 1})
+        self.assertIsNotNone(job["finished"])
+        self.assertEqual(list(self._host_list()), ["host2"])
+
+    def test_update_tags_job(self):
+        job = self._submit_job("update_tags", {"operation": "apply", "tags": TAGS})
+        self._run_job()
+
+        job = self.get(JOB_URL + "/" + job["id"], 200)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["processed"], 2)
+        self.assertEqual(job["result"], {"updated": 2})
+        for host in self._host_list().values():
+            self.assertEqual(host["tags"], TAGS)
+
+    def test_update_facts_job(self):
+        filters = {"display_name": "host2"}
+        self._submit_job(
+            "update_facts",
+            {"operation": "merge", "namespace": "ns1", "facts": {"key2": "value2"}, "filters": filters},
+        )
+        self._submit_job(
+            "update_facts",
+            {"operation": "replace", "namespace": "ns1", "facts": {"key3": "value3"}},
+        )
+        self._run_job()
+
+        hosts = self._host_list()
+        self.assertEqual(hosts["host1"]["facts"], [{"namespace": "ns1", "facts": {"key1": "value1"}}])
+        self.assertEqual(
+            hosts["host2"]["facts"],
+            [{"namespace": "ns1", "facts": {"key1": "value1", "key2": "value2"}}],
+        )
+
+        self.assertEqual(self._run_job().result, {"updated": 2})
+        for host in self._host_list().values():
+            self.assertEqual(host["facts"], [{"namespace": "ns1", "facts": {"key3": "value3"}}])
+
+    def test_update_facts_job_with_nested_and_null_facts(self):
+        facts = {"ns1": {"key1": {"a": 1, "b": 2}, "key2": ["a", "b"]}, "ns2": None}
+        with self.app.app_context():
+            Host.query.update({Host.facts: facts}, synchronize_session=False)
+            db.session.commit()
+
+        for namespace, merged_facts in (
+            ("ns1", {"key1": {"a": 1}, "key2": ["a"]}),
+            ("ns2", {"key3": "value3"}),
+        ):
+            with self.subTest(namespace=namespace):
+                self._submit_job(
+                    "update_facts",
+                    {"operation": "merge", "namespace": namespace, "facts": merged_facts},
+                )
+                self.assertEqual(self._run_job().result, {"updated": 2})
+
+        self._submit_job(
+            "update_facts", {"operation": "replace", "namespace": "ns1", "facts": {}}
+        )
+        self.assertEqual(self._run_job().result, {"updated": 2})
+
+        with self.app.app_context():
+            Host.query.update({Host.facts: {"ns1": None}}, synchronize_session=False)
+            db.session.commit()
+        self._submit_job(
+            "update_facts", {"operation": "replace", "namespace": "ns1", "facts": {"k": "v"}}
+        )
+        self.assertEqual(self._run_job().result, {"updated": 2})
+
+        for host in self._host_list().values():
+            self.assertEqual(host["facts"], [{"namespace": "ns1", "facts": {"k": "v"}}])
+
+    def test_expired_job_lease(self):
+        job = self._submit_job("update_tags", {"operation": "apply", "tags": TAGS})
+
+        # A worker claimed the job and died
+        with self.app.app_context():
+            Job.query.update(
+                {
+                    Job.status: "running",
+                    Job.locked_until: datetime.utcnow() + timedelta(minutes=1),
+                },
+                synchronize_session=False,
+            )
+            db.session.commit()
+        self.assertIsNone(self._run_job())
+
+        with self.app.app_context():
+            Job.query.update(
+                {Job.locked_until: datetime.utcnow() - timedelta(seconds=1)},
+                synchronize_session=False,
+            )
+            db.session.commit()
+        self.assertEqual(self._run_job().id, uuid.UUID(job["id"]))
+
+        job = self.get(JOB_URL + "/" + job["id"], 200)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["result"], {"updated": 2})
+
+    def test_failed_job(self):
+        def fail(account, parameters, chunk_size, report):
+            report(1)
+            raise ValueError("Failed")
+
+        job = self._submit_job("update_tags", {"operation": "apply", "tags": TAGS})
+        self._run_job({"update_tags": fail})
+
+        job = self.get(JOB_URL + "/" + job["id"], 200)
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "Failed")
+        self.assertEqual(job["processed"], 1)
+        self.assertIsNone(job["result"])
+
+    def test_invalid_job(self):
+        invalid_jobs = [
+            ("delete_all_hosts", {}),
+            ("delete_hosts", {}),
+            ("delete_hosts", {"filters": {"display_name": ""}}),
+            ("delete_hosts", {"filters": {"account": ACCOUNT}}),
+            ("delete_hosts", {"filters": {"updated_before": "yesterday"}}),
+            ("delete_hosts", {"filters": {"tag": TAGS[0]}}),
+            ("update_tags", {"operation": "replace", "tags": TAGS}),
+            ("update_tags", {"operation": "apply", "tags": []}),
+            ("update_facts", {"operation": "merge", "namespace": "ns1", "facts": {}}),
+            ("update_facts", {"operation": "replace", "facts": {}}),
+        ]
+        for operation, parameters in invalid_jobs:
+            with self.subTest(operation=operation, parameters=parameters):
+                self._submit_job(operation, parameters, 400)
+
+        self.assertIsNone(self._run_job())
+
+    def test_get_job_of_another_account(self):
+        with self.app.app_context():
+            job = Job(account="000000", operation="delete_hosts", parameters={}, status="queued")
+            db.session.add(job)
+            db.session.commit()
+            job_id = str(job.id)
+
+        self.get(JOB_URL + "/" + job_id, 404)
+        self.get(JOB_URL + "/" + str(uuid.uuid4()), 404)
+
+
+class HostImportTestCase(DBAPITestCase):
+    def setUp(self):
+        super(HostImportTestCase, self).setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.import_path = os.path.join(self.temp_dir.name, "hosts.ndjson")
+        self.checkpoint_path = os.path.join(self.temp_dir.name, "checkpoint")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        super(HostImportTestCase, self).tearDown()
+
+    def _write_import_file(self, hosts):
+        with open(self.import_path, "w") as fp:
+            for host in hosts:
+                fp.write((host if type(host) == str else json.dumps(host)) + "\n")
+
+    def _import(self, **kwargs):
+        with self.app.app_context():
+            return import_hosts(self.import_path, **kwargs)
+
+    def _import_host(self, insights_id, display_name=None, facts=None):
+        return {
+            "account": ACCOUNT,
+            "insights_id": insights_id,
+            "display_name": display_name,
+            "facts": facts if facts else [],
+        }
+
+    def test_import_creates_and_merges_hosts(self):
+        ns1_facts = [{"namespace": "ns1", "facts": {"key1": "value1"}}]
+        existing_host = HostWrapper(
+            self.post(HOST_URL, self._import_host("1234", "existing", ns1_facts), 201)
+        )
+
+        ns2_facts = [{"namespace": "ns2", "facts": {"key2": "value2"}}]
+        self._write_import_file(
+            [
+                self._import_host("1234", facts=ns2_facts),
+                self._import_host("5678", "new"),
+                self._import_host("5678", "renamed"),
+                "not json",
+                {"account": ACCOUNT, "display_name": "no canonical facts"},
+                self._import_host("9012"),
+            ]
+        )
+
+        progress = self._import(batch_size=2)
+
+        self.assertEqual(progress.lines, 6)
+        self.assertEqual(progress.created, 2)
+        self.assertEqual(progress.updated, 2)
+        self.assertEqual(progress.unchanged, 0)
+        self.assertEqual(progress.skipped, 2)
+
+        response = self.get(HOST_URL, 200)
+        self.assertEqual(response["total"], 3)
+
+        display_names = sorted(h["display_name"] or "" for h in response["results"])
+        self.assertListEqual(display_names, ["", "existing", "renamed"])
+
+        response = self.get(f"{HOST_URL}/{existing_host.id}", 200)
+        merged_host = HostWrapper(response["results"][0])
+        self.assertEqual(merged_host.display_name, "existing")
+        self.assertListEqual(merged_host.facts, ns1_facts + ns2_facts)
+
+    def test_import_resumes_from_checkpoint(self):
+        self._write_import_file(
+            [self._import_host("1234", "first"), self._import_host("5678", "second")]
+        )
+
+        progress = self._import(batch_size=1, checkpoint_path=self.checkpoint_path)
+        self.assertEqual(progress.created, 2)
+
+        with open(self.import_path, "a") as fp:
+            fp.write(json.dumps(self._import_host("9012", "third")) + "\n")
+
+        progress = self._import(batch_size=1, checkpoint_path=self.checkpoint_path)
+        self.assertEqual(progress.lines, 3)
+        self.assertEqual(progress.created, 3)
+        self.assertEqual(progress.updated, 0)
+
+        response = self.get(HOST_URL, 200)
+        self.assertEqual(response["total"], 3)
+
+    def test_import_skips_unchanged_hosts(self):
+        facts = [{"namespace": "ns1", "facts": {"key1": "value1"}}]
+        self._write_import_file(
+            [self._import_host("1234", "first", facts), self._import_host("5678")]
+        )
+        self._import()
+        hosts = self.get(HOST_URL, 200)["results"]
+
+        self._write_import_file(
+            [
+                self._import_host("1234", "first", facts),
+                self._import_host("5678", "renamed"),
+            ]
+        )
+        progress = self._import()
+
+        self.assertEqual(progress.created, 0)
+        self.assertEqual(progress.updated, 1)
+        self.assertEqual(progress.unchanged, 1)
+
+        reimported_hosts = {
+            host["id"]: host for host in self.get(HOST_URL, 200)["results"]
+        }
+        for host in hosts:
+            reimported_host = reimported_hosts[host["id"]]
+            if host["display_name"] == "first":
+                self.assertEqual(reimported_host, host)
+            else:
+                self.assertNotEqual(reimported_host["updated"], host["updated"])
+
+    def test_import_records_unchanged_check_in(self):
+        self._write_import_file([self._import_host("1234", "first")])
+        self._import()
+
+        last_seen = datetime.utcnow() - timedelta(days=100)
+        with self.app.app_context():
+            Host.query.update({Host.last_seen: last_seen}, synchronize_session=False)
+            db.session.commit()
+
+        self.assertEqual(self._import().unchanged, 1)
+        with self.app.app_context():
+            self.assertGreater(Host.query.one().last_seen, last_seen)
+
+        # Not written again within the interval
+        with self.app.app_context():
+            last_seen = Host.query.one().last_seen
+        self._import()
+        with self.app.app_context():
+            self.assertEqual(Host.query.one().last_seen, last_seen)
+
+
 class AuthTestCase(DBAPITestCase):
     @staticmethod
     def _valid_identity():
@@ -617,6 +1775,126 @@ class AuthTestCase(DBAPITestCase):
         self.assertEqual(200, response.status_code)  # OK
 
 
+class ServerTimingTestCase(PreCreatedHostsBaseTestCase):
+    """
+    Tests the request processing time is broken down into phases in the
+    Server-Timing header.
+    """
+
+    def _server_timing(self, response):
+        timings = {}
+        for entry in response.headers["Server-Timing"].split(", "):
+            name, duration = entry.split(";dur=")
+            timings[name] = float(duration)
+        return timings
+
+    def test_get_host_list(self):
+        response = self.get(HOST_URL, 200, return_response_as_json=False)
+        timings = self._server_timing(response)
+
+        self.assertEqual(
+            list(timings),
+            ["validation", "identity", "db", "orm", "serialization", "total"],
+        )
+        self.assertTrue(all(duration >= 0 for duration in timings.values()))
+        self.assertGreaterEqual(
+            timings["total"], sum(timings.values()) - timings["total"] - 1
+        )
+
+    def test_invalid_request(self):
+        response = self.get(f"{HOST_URL}?page=0", 400, return_response_as_json=False)
+        self.assertEqual(list(self._server_timing(response)), ["total"])
+
+
+class RateLimitTestCase(DBAPITestCase):
+    """
+    Tests the per-account rate limits of the API operations.
+    """
+
+    def setUp(self):
+        env = {
+            "INVENTORY_RATE_LIMITS": "getHostList=2/minute",
+            "INVENTORY_CONCURRENCY_LIMITS": "lookupHosts=1",
+        }
+        with unittest.mock.patch.dict(os.environ, env):
+            super(RateLimitTestCase, self).setUp()
+
+    def _get(self, path, account_number=ACCOUNT):
+        identity = {"identity": {"account_number": account_number}}
+        headers = {"x-rh-identity": b64encode(json.dumps(identity).encode())}
+        return self.client().get(path, headers=headers)
+
+    def test_rate_limit_exceeded(self):
+        for _ in range(2):
+            self.assertEqual(self._get(HOST_URL).status_code, 200)
+
+        response = self._get(HOST_URL)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json["title"], "Too Many Requests")
+        self.assertTrue(1 <= int(response.headers["Retry-After"]) <= 60)
+
+    def test_limits_are_per_account_and_operation(self):
+        for _ in range(3):
+            self._get(HOST_URL)
+
+        self.assertEqual(self._get(HOST_URL, "000002").status_code, 200)
+        self.assertEqual(self._get(TAG_URL).status_code, 200)
+
+    def test_invalid_identity_is_not_counted(self):
+        for _ in range(3):
+            response = self.client().get(HOST_URL, headers={"x-rh-identity": "invalid"})
+            self.assertEqual(response.status_code, 403)
+
+        self.assertEqual(self._get(HOST_URL).status_code, 200)
+
+    def test_concurrency_slot_is_held_while_streaming(self):
+        identity = {"identity": {"account_number": ACCOUNT}}
+        headers = {"x-rh-identity": b64encode(json.dumps(identity).encode())}
+
+        def _lookup(client):
+            return client.post(
+                HOST_URL + "/lookup",
+                json={"ids": [str(uuid.uuid4())]},
+                headers=headers,
+                buffered=False,
+            )
+
+        client = self.client()
+        first = _lookup(client)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(_lookup(client).status_code, 429)
+
+        self.assertEqual(json.loads(first.get_data())["count"], 0)
+        first.close()
+        second = _lookup(client)
+        self.assertEqual(second.status_code, 200)
+        second.close()
+
+    def test_async_app_is_limited(self):
+        identity = {"identity": {"account_number": ACCOUNT}}
+        headers = {"x-rh-identity": b64encode(json.dumps(identity).encode()).decode()}
+
+        async def _get_all():
+            env = {"INVENTORY_RATE_LIMITS": "getHostList=2/minute"}
+            with unittest.mock.patch.dict(os.environ, env):
+                app = create_async_app("testing")
+            async with TestClient(TestServer(app)) as client:
+                responses = []
+                for _ in range(3):
+                    response = await client.get(HOST_URL, headers=headers)
+                    responses.append((response.status, response.headers.get("Retry-After")))
+                return responses
+
+        loop = asyncio.new_event_loop()
+        try:
+            responses = loop.run_until_complete(_get_all())
+        finally:
+            loop.close()
+
+        self.assertEqual([status for status, _ in responses], [200, 200, 429])
+        self.assertTrue(1 <= int(responses[2][1]) <= 60)
+
+
 class HealthTestCase(BaseAPITestCase):
     """
     Tests the health check endpoint.
@@ -637,6 +1915,88 @@ class HealthTestCase(BaseAPITestCase):
         response = self.client().get(METRICS_URL)  # No identity header.
         self.assertEqual(200, response.status_code)
 
+    def test_metrics_are_cached(self):
+        """
+        Consecutive scrapes share the collected metrics.
+        """
+        first = self.client().get(METRICS_URL)
+        metrics.create_host_count.inc()
+        second = self.client().get(METRICS_URL)
+        self.assertEqual(first.data, second.data)
+        self.assertIn(b"inventory_metrics_scrape_seconds", second.data)
+
+
+class ProfilingTestCase(DBAPITestCase):
+    """
+    Tests the API operations are profiled when requested and the profiles
+    can be downloaded.
+    """
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+
+        env = {
+            "INVENTORY_PROFILE_DIR": self.profile_dir,
+            "INVENTORY_PROFILE_TOKEN": "secret",
+            "INVENTORY_PROFILE_MAX_FILES": "2",
+        }
+        with unittest.mock.patch.dict(os.environ, env):
+            super(ProfilingTestCase, self).setUp()
+
+    def _get_hosts(self, profile_token=None):
+        headers = self._get_valid_auth_header()
+        if profile_token:
+            headers["x-inventory-profile"] = profile_token
+        response = self.client().get(HOST_URL, headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    def _profiles(self):
+        response = self.client().get(PROFILES_URL)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_profile_on_request(self):
+        self._get_hosts()
+        self._get_hosts("invalid")
+        self.assertEqual(self._profiles(), {})
+
+        self._get_hosts("secret")
+        profiles = self._profiles()
+        self.assertEqual(list(profiles), ["api.host.getHostList"])
+        self.assertEqual(len(profiles["api.host.getHostList"]), 1)
+
+        file_name = profiles["api.host.getHostList"][0]
+        response = self.client().get(f"{PROFILES_URL}/api.host.getHostList/{file_name}")
+        self.assertEqual(response.status_code, 200)
+
+        profile_path = os.path.join(self.profile_dir, "downloaded.prof")
+        with open(profile_path, "wb") as fp:
+            fp.write(response.data)
+        stats = pstats.Stats(profile_path)
+        self.assertTrue(
+            any(function_name == "getHostList" for _, _, function_name in stats.stats)
+        )
+
+    def test_old_profiles_are_removed(self):
+        for _ in range(3):
+            self._get_hosts("secret")
+
+        self.assertEqual(len(self._profiles()["api.host.getHostList"]), 2)
+
+    def test_download_outside_of_profile_dir(self):
+        self._get_hosts("secret")
+        for path in ("/../api.host.getHostList/x.prof", "/api.host.getHostList/..%2F..%2Fx"):
+            with self.subTest(path=path):
+                response = self.client().get(PROFILES_URL + path)
+                self.assertEqual(response.status_code, 404)
+
+
+class ProfilingDisabledTestCase(BaseAPITestCase):
+    def test_profiles_not_found(self):
+        response = self.client().get(PROFILES_URL)
+        self.assertEqual(response.status_code, 404)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+Query plan regression tests.
+
+The API operations are called on a generated data set of a realistic shape
+and every statement they issue is explained.  A sequential scan of the hosts
+table or an estimated cost over the limit fails the test, so a change of a
+filter expression that stops the queries from using the indexes is caught.
+"""
+import re
+import unittest
+
+from contextlib import contextmanager
+from sqlalchemy import event, text
+
+from app import create_app, db
+from app.models import Host, HostIpAddress, HostMacAddress
+from test_api import ACCOUNT, DBAPITestCase, HOST_URL, inject_qs, TAG_URL
+
+
+HOST_COUNT = 100000
+ACCOUNT_COUNT = 1000
+
+# A sequential scan of the hosts table is estimated at thousands
+MAX_TOTAL_COST = 1000
+
+EXPLAINED_STATEMENT = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b", re.IGNORECASE)
+
+GENERATE_HOSTS_SQL = """
+    INSERT INTO {hosts} (
+        id, account, display_name, created_on, modified_on, facts, tags, canonical_facts
+    )
+    SELECT
+        md5(i::text)::uuid,
+        lpad((i % :account_count)::text, 6, '0'),
+        'host-' || i,
+        now() - i * interval '1 second',
+        now() - (i % 7919) * interval '1 minute',
+        jsonb_build_object('ns1', jsonb_build_object('key1', 'value' || i % 10)),
+        jsonb_build_array('env/tier:' || i % 3),
+        jsonb_build_object(
+            'fqdn', 'host-' || i || '.example.com',
+            'insights_id', md5('insights' || i)::uuid::text,
+            'ip_addresses', jsonb_build_array(('10.0.0.0'::inet + i)::text),
+            'mac_addresses', jsonb_build_array(
+                substr(md5('mac' || i), 1, 12)::macaddr::text
+            )
+        )
+    FROM generate_series(1, :host_count) AS i
+"""
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+class QueryPlanTestCase(DBAPITestCase):
+    """
+    The data set is generated once for all the tests, the operations
+    changing the hosts touch only a few of them.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(QueryPlanTestCase, cls).setUpClass()
+        cls.app = create_app(config_name="testing")
+        with cls.app.app_context():
+            db.create_all()
+            db.session.execute(
+                text(GENERATE_HOSTS_SQL.format(hosts=Host.__table__.name)),
+                {"account_count": ACCOUNT_COUNT, "host_count": HOST_COUNT},
+            )
+            for model in (Host, HostIpAddress, HostMacAddress):
+                db.session.execute(text(f"ANALYZE {model.__table__.name}"))
+            db.session.commit()
+
+            cls.host_ids = [
+                str(host_id)
+                for host_id, in db.session.query(Host.id)
+                .filter(Host.account == ACCOUNT)
+                .order_by(Host.id)
+            ]
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def tearDown(self):
+        # The data set is kept for the other tests
+        with self.app.app_context():
+            db.session.remove()
+
+    @contextmanager
+    def assertIndexedQueries(self):
+        """
+        Explain all statements issued in the block and check their plans.
+        """
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if EXPLAINED_STATEMENT.match(statement):
+                statements.append((statement, parameters[0] if executemany else parameters))
+
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            yield
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        self.assertTrue(statements, "No statements were issued")
+        for statement, parameters in statements:
+            with self.subTest(statement=statement):
+                self._check_plan(self._explain(statement, parameters))
+
+    def _explain(self, statement, parameters):
+        with self.app.app_context():
+            result = db.session.connection().exec_driver_sql(
+                "EXPLAIN (FORMAT JSON) " + statement, parameters
+            )
+            plan = result.scalar()[0]["Plan"]
+            db.session.rollback()
+        return plan
+
+    def _check_plan(self, plan):
+        for node in _plan_nodes(plan):
+            if node["Node Type"] == "Seq Scan":
+                self.assertNotEqual(
+                    node["Relation Name"],
+                    Host.__table__.name,
+                    "The hosts table is scanned sequentially",
+                )
+        self.assertLess(plan["Total Cost"], MAX_TOTAL_COST)
+
+    def test_add_host(self):
+        host_data = {
+            "account": ACCOUNT,
+            "display_name": "new-host",
+            "fqdn": "new-host.example.com",
+        }
+        with self.assertIndexedQueries():
+            self.post(HOST_URL, host_data, 201)
+            self.post(HOST_URL, {**host_data, "display_name": "renamed-host"}, 200)
+
+    def test_get_host_list(self):
+        queries = [
+            {},
+            {"order_by": "display_name", "order_how": "ASC"},
+            {"order_by": "created"},
+            {"display_name": "host-1"},
+            {"tag": "env/tier:1"},
+            {"updated_since": "2000-01-01T00:00:00Z"},
+            {"q": "host-1"},
+            {"q": "value1", "order_by": "display_name"},
+            {"ip_address": "10.0.1.0/24"},
+            {"ip_address": "10.0.0.1"},
+            {"mac_address": "00:00:00:00:00:01"},
+            {"page": "2", "per_page": "10"},
+        ]
+        for params in queries:
+            with self.subTest(params=params), self.assertIndexedQueries():
+                self.get(inject_qs(HOST_URL, **params), 200)
+
+    def test_get_host_by_id(self):
+        with self.assertIndexedQueries():
+            self.get(HOST_URL + "/" + ",".join(self.host_ids[:10]), 200)
+
+    def test_lookup_hosts(self):
+        with self.assertIndexedQueries():
+            self.post(HOST_URL + "/lookup", {"ids": self.host_ids[:50]}, 200)
+
+    def test_get_host_changes(self):
+        with self.assertIndexedQueries():
+            response = self.get(inject_qs(HOST_URL + "/changes", limit="10"), 200)
+            self.get(inject_qs(HOST_URL + "/changes", cursor=response["cursor"]), 200)
+
+    def test_get_fact_counts(self):
+        for params in ({"canonical_fact": "fqdn"}, {"fact": "ns1/key1", "tag": "env/tier:1"}):
+            with self.subTest(params=params), self.assertIndexedQueries():
+                self.get(inject_qs(HOST_URL + "/aggregate", **params), 200)
+
+    def test_get_tags(self):
+        with self.assertIndexedQueries():
+            self.get(inject_qs(TAG_URL, search="env"), 200)
+
+    def test_get_facts(self):
+        url = HOST_URL + "/" + ",".join(self.host_ids[:10]) + "/facts/ns1"
+        with self.assertIndexedQueries():
+            self.get(url, 200)
+
+    def test_update_facts(self):
+        url = HOST_URL + "/" + self.host_ids[0] + "/facts/ns1"
+        with self.assertIndexedQueries():
+            self.patch(url, {"key2": "value2"}, 200)
+            self.put(url, {"key1": "value1"}, 200)
+
+    def test_update_tags(self):
+        operation = {"operation": "apply", "tags": ["env/plan:test"]}
+        with self.assertIndexedQueries():
+            self.patch(HOST_URL + "/" + self.host_ids[1] + "/tags", operation, 200)
+            self.patch(inject_qs(HOST_URL + "/tags", display_name="host-1501"), operation, 200)
+
+    def test_delete_hosts(self):
+        with self.assertIndexedQueries():
+            self.delete(HOST_URL + "/" + self.host_ids[2], 200)
+            self.delete(inject_qs(HOST_URL, display_name="host-2501"), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()